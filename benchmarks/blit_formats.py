@@ -0,0 +1,81 @@
+'''
+Measures how much faster blitting gets once the assets are converted to the display pixel format.
+
+Run from the repository root:
+python -m benchmarks.blit_formats
+'''
+
+import os
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # Set it to your video driver to measure against a real display
+
+import pygame
+
+
+from robodude.utils.AssetCache import AssetCache
+from robodude.utils.AnimatedSpriteSheet import AnimatedSpriteSheet
+
+
+# (name, filename, w, h) of the images blitted every frame
+IMAGES = [
+    ('block', 'media/dungeon01/SolidTile.png', 50, 50),
+    ('gate', 'media/dungeon01/DoorUnlocked.png', 50, 50),
+    ('potion', 'media/consumables01/health_blob.png', 20, 20),
+    ('player icon', 'media/icons01/player_icon_right_128.png', 48, 48),
+]
+
+# (name, filename, rows, cols, w, h) of the spritesheets blitted every frame
+SHEETS = [
+    ('enemy icon', 'media/enemy01/10_enemy_icon_idle_left_spritesheet.png', 1, 10, 50, 50),
+    ('player idle', 'media/player01/10_idle_right_spritesheet.png', 1, 10, -1, 556),
+]
+
+
+def time_blits(screen, surface, area, blits, repeats=5):
+    '''
+    Returns the best average time (in seconds) of a single blit over a few repeats.
+    '''
+    best = None
+    for r in range(repeats):
+        start = time.perf_counter()
+        for i in range(blits):
+            screen.blit(surface, (0, 0), area)
+        elapsed = (time.perf_counter() - start) / blits
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(blits=2000):
+    '''
+    Returns a list of (name, raw seconds per blit, converted seconds per blit).
+    '''
+    pygame.init()
+    cache = AssetCache()
+    screen = cache.set_display_mode((1600, 900), 0, 32)
+
+    results = []
+    for name, filename, w, h in IMAGES:
+        raw = AssetCache.load_image(filename, w, h)
+        converted = cache.image(filename, w, h)
+        results.append((name, time_blits(screen, raw, None, blits), time_blits(screen, converted, None, blits)))
+
+    for name, filename, rows, cols, w, h in SHEETS:
+        raw = AnimatedSpriteSheet.load_sheet(filename, rows, cols, w, h)
+        converted = cache.get(('sheet', filename, rows, cols, w, h), lambda: raw)
+        area = (0, 0, raw.get_width() // cols, raw.get_height() // rows)
+        results.append((name, time_blits(screen, raw, area, blits // 10), time_blits(screen, converted, area, blits // 10)))
+
+    return results
+
+
+def main():
+    blits = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"{'asset':<14}{'raw (us)':>12}{'converted (us)':>18}{'speedup':>10}")
+    for name, raw, converted in run(blits):
+        print(f"{name:<14}{raw * 1e6:>12.2f}{converted * 1e6:>18.2f}{raw / converted:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
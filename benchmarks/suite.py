@@ -0,0 +1,277 @@
+'''
+Measures the hot paths of the game (map parsing and loading, dungeon initialization and materialization, rendering,
+collision and interaction checks, player movement, spritesheet construction and battle rendering)
+on generated maps of several sizes (see MapGenerator).\n
+The results (best time of a single call, in seconds) are written to a JSON file and compared
+against a stored baseline, so a regression in any of them shows up as a number.\n
+Timings depend on the machine, so compare against a baseline saved on the same one.
+
+Run from the repository root:
+python -m benchmarks.suite [--output FILE] [--baseline FILE] [--save-baseline] [--threshold X] [--quick]
+
+--output - where to write the results (default: benchmarks/results.json)
+--baseline - the results to compare against (default: benchmarks/baseline.json)
+--save-baseline - also store the results as the new baseline
+--threshold - how many times slower than the baseline counts as a regression (default: 1.25)
+--quick - fewer repeats (less accurate, for a fast sanity check)
+'''
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import tempfile
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # Set it to your video driver to measure against a real display
+
+import pygame
+
+
+from robodude.characters.Player import Player
+from robodude.characters.Battle_Ninja import Battle_Ninja
+from robodude.map.Dungeon import Dungeon
+from robodude.map.Battle import Battle
+from robodude.map.MapGenerator import MapGenerator
+from robodude.map.CompiledMap import CompiledMap
+from robodude.utils.AssetCache import AssetCache
+from robodude.utils.AnimatedSpriteSheet import AnimatedSpriteSheet
+
+
+# (name, rows, cols) of the synthetic maps
+MAP_SIZES = [
+    ('small', 12, 16),
+    ('medium', 36, 48),
+    ('large', 72, 96),
+]
+
+# (name, rows, cols) of the synthetic maps that are only parsed and materialized (they are too big to be rendered as a whole)
+PARSE_SIZES = [
+    ('huge', 500, 500),
+    ('max', 1000, 1000),
+]
+
+# A result is reported as a regression if it is this many times slower than the baseline
+REGRESSION_THRESHOLD = 1.25
+
+# Fast benchmarks are called repeatedly until a single repeat takes at least this long (in seconds)
+MIN_REPEAT_TIME = 0.05
+
+DEFAULT_OUTPUT = 'benchmarks/results.json'
+DEFAULT_BASELINE = 'benchmarks/baseline.json'
+
+
+def best_time(func, number, repeats, setup=None):
+    '''
+    Returns the best average time (in seconds) of a single call of 'func' over a few repeats.\n
+    If 'number' is None, it is doubled until a single repeat takes at least MIN_REPEAT_TIME.\n
+    'setup' (if given) is called before every repeat, outside of the measured time.
+    '''
+    if number is None:
+        number = 1
+        while True:
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            for i in range(number):
+                func()
+            if time.perf_counter() - start >= MIN_REPEAT_TIME:
+                break
+            number *= 2
+
+    best = None
+    for r in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for i in range(number):
+            func()
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_dungeon(results, name, mapfile, repeats):
+    '''
+    Measures everything that depends on the size of the map.
+    '''
+    player = Player('Jimmy', 'The Spelunker')
+    dungeon = Dungeon(mapfile, player, headless=True)
+    dungeon.spawn_player()
+
+    results[f'parse/{name}'] = best_time(lambda: Dungeon.parse(mapfile), None, repeats)
+    results[f'init_dungeon/{name}'] = best_time(dungeon.init_dungeon, 5, repeats)
+    results[f'render/{name}'] = best_time(dungeon.render, None, repeats)
+
+    # Collision checks of player sized boxes scattered all over the map
+    rng = random.Random(1)
+    w, h = dungeon.calc_dungeon_size()
+    boxes = [pygame.Rect(rng.randrange(w - player.w), rng.randrange(dungeon.top_bar_height, h - player.h), player.w, player.h)
+             for i in range(1000)]
+    results[f'check_for_collision/{name}'] = best_time(
+        lambda: [dungeon.check_for_collision(box, 'blocks') for box in boxes], None, repeats) / len(boxes)
+
+    # A step of the player in a random direction from each of the boxes
+    moves = [(box.topleft, rng.choice((-1, 0, 1)) * player.velocity, rng.choice((-1, 0, 1)) * player.velocity)
+             for box in boxes]
+
+    def move_everywhere():
+        for (x, y), dx, dy in moves:
+            player.loc['x'], player.loc['y'] = x, y
+            dungeon.move_player(dx, dy)
+
+    results[f'move_player/{name}'] = best_time(move_everywhere, None, repeats) / len(moves)
+
+    # Interactions with the player teleporting between the entities (consuming them),
+    # the dungeon is reset before every repeat
+    spots = [(rect[0], rect[1]) for k in dungeon.interractable_tiles_index for rect in dungeon.collision_index[k]]
+    spots += [(box.x, box.y) for box in boxes[:max(0, 200 - len(spots))]]
+
+    def interract_everywhere():
+        for x, y in spots:
+            player.x = x
+            player.y = y
+            dungeon.update_interractions()
+
+    results[f'update_interractions/{name}'] = best_time(
+        interract_everywhere, 1, repeats, setup=dungeon.init_dungeon) / len(spots)
+    return dungeon
+
+
+def bench_compiled(results, name, mapfile, repeats):
+    compiled = mapfile + CompiledMap.EXTENSION
+    CompiledMap.compile(mapfile, compiled)
+    results[f'load_compiled/{name}'] = best_time(lambda: CompiledMap.load(compiled), None, repeats)
+
+
+def bench_materialize(results, name, mapfile, repeats):
+    '''
+    Measures turning every tile of the map into entities (as if the player went everywhere).
+    '''
+    dungeon = Dungeon(mapfile, Player('Jimmy', 'The Spelunker'), headless=True)
+    dungeon.dungeon.load_all()
+    everything = pygame.Rect((0, 0), dungeon.calc_size())
+    results[f'materialize/{name}'] = best_time(
+        lambda: dungeon.materialize_region(everything), 1, repeats, setup=dungeon.init_dungeon)
+
+
+def bench_crowd(results, mapfile, repeats):
+    '''
+    Measures rendering a view full of enemies (their icons are animated).
+    '''
+    MapGenerator(36, 48, seed=0, enemies=0.6, potions=0, ammo=0).write(mapfile)
+    dungeon = Dungeon(mapfile, Player('Jimmy', 'The Spelunker'), headless=True)
+    dungeon.spawn_player()
+    results['render/crowd'] = best_time(dungeon.render, None, repeats)
+
+
+def bench_sheets(results, repeats):
+    filename = 'media/enemy01/10_enemy_icon_idle_left_spritesheet.png'
+    results['AnimatedSpriteSheet/cached'] = best_time(
+        lambda: AnimatedSpriteSheet(filename, rows=1, cols=10, w=50, h=50), None, repeats)
+    results['AnimatedSpriteSheet/uncached'] = best_time(
+        lambda: AnimatedSpriteSheet(filename, rows=1, cols=10, w=50, h=50), 1, repeats, setup=AssetCache.shared().clear)
+
+
+def bench_battle(results, dungeon, repeats):
+    random.seed(0)
+    dungeon.player.load_battle_assets()
+    battle = Battle(dungeon.player, dungeon.ui, Battle_Ninja.randomNinja(), dungeon.clock, 630, 600, dungeon.fps)
+    results['Battle.render'] = best_time(lambda: battle.render(display_update=False), None, repeats)
+
+
+def run(quick=False):
+    '''
+    Returns a dict of benchmark name -> seconds per call.
+    '''
+    pygame.init()
+    repeats = 2 if quick else 7
+    results = dict()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dungeon = None
+        for name, rows, cols in MAP_SIZES:
+            mapfile = os.path.join(tmp, f'{name}.txt')
+            MapGenerator(rows, cols, seed=0).write(mapfile)
+            dungeon = bench_dungeon(results, name, mapfile, repeats)
+            bench_compiled(results, name, mapfile, repeats)
+
+        for name, rows, cols in PARSE_SIZES:
+            mapfile = os.path.join(tmp, f'{name}.txt')
+            MapGenerator(rows, cols, seed=0).write(mapfile)
+            results[f'parse/{name}'] = best_time(lambda: Dungeon.parse(mapfile), None, repeats)
+            bench_compiled(results, name, mapfile, repeats)
+            bench_materialize(results, name, mapfile, repeats)
+
+        bench_crowd(results, os.path.join(tmp, 'crowd.txt'), repeats)
+        bench_sheets(results, repeats)
+        bench_battle(results, dungeon, repeats)
+
+    return results
+
+
+def compare(results, baseline):
+    '''
+    Returns a list of (name, seconds, baseline seconds or None, ratio or None), in the order of the results.
+    '''
+    rows = []
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        rows.append((name, seconds, base, seconds / base if base else None))
+    return rows
+
+
+def main():
+    args = sys.argv[1:]
+
+    def option(flag, default):
+        if flag in args and args.index(flag) + 1 < len(args):
+            return args[args.index(flag) + 1]
+        return default
+
+    output = option('--output', DEFAULT_OUTPUT)
+    baseline_file = option('--baseline', DEFAULT_BASELINE)
+    threshold = float(option('--threshold', REGRESSION_THRESHOLD))
+
+    results = run(quick='--quick' in args)
+    report = {
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'results': results
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=4)
+
+    baseline = dict()
+    if os.path.isfile(baseline_file):
+        with open(baseline_file) as f:
+            baseline = json.load(f)['results']
+
+    print(f"{'benchmark':<34}{'time (us)':>12}{'baseline (us)':>16}{'change':>10}")
+    regressions = 0
+    for name, seconds, base, ratio in compare(results, baseline):
+        if base is None:
+            print(f"{name:<34}{seconds * 1e6:>12.2f}{'-':>16}{'-':>10}")
+            continue
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{name:<34}{seconds * 1e6:>12.2f}{base * 1e6:>16.2f}{ratio:>9.2f}x{flag}")
+
+    print(f"\nResults written to '{output}'.")
+    if regressions:
+        print(f"{regressions} benchmark(s) more than {threshold}x slower than '{baseline_file}'.")
+
+    if '--save-baseline' in args:
+        with open(baseline_file, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"Baseline saved to '{baseline_file}'.")
+
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+'''
+Compiles the text maps into the binary format (see robodude/map/CompiledMap.py),
+which main.py loads instead of the text map whenever it is up to date.
+
+Usage:
+python compile_maps.py [map files...] [--output DIR] [--no-tables]
+
+Without map files every map in "maps/" is compiled.
+--output - where to write the compiled maps (default: "maps/compiled/")
+--no-tables - don't write the prebuilt entity tables
+'''
+
+import os
+import sys
+from os import listdir
+from os.path import isfile, join, basename, splitext
+from robodude.map.CompiledMap import CompiledMap
+
+
+MAPS_PATH = "maps/"
+COMPILED_PATH = "maps/compiled/"
+
+
+def compiled_path(mapfile, output=COMPILED_PATH):
+    '''
+    Returns the path the compiled version of the text map is written to.
+    '''
+    return join(output, splitext(basename(mapfile))[0] + CompiledMap.EXTENSION)
+
+
+def main():
+    args = sys.argv[1:]
+    if '--help' in args:
+        print(__doc__)
+        return
+
+    output = COMPILED_PATH
+    if '--output' in args and args.index('--output') + 1 < len(args):
+        i = args.index('--output')
+        output = args[i + 1]
+        del args[i:i + 2]
+    entity_tables = '--no-tables' not in args
+    mapfiles = [a for a in args if not a.startswith('--')]
+    if not mapfiles:
+        mapfiles = [join(MAPS_PATH, m) for m in listdir(MAPS_PATH) if isfile(join(MAPS_PATH, m))]
+
+    os.makedirs(output, exist_ok=True)
+    for mapfile in mapfiles:
+        target = compiled_path(mapfile, output)
+        CompiledMap.compile(mapfile, target, entity_tables)
+        print(f"{mapfile} -> {target}")
+
+
+if __name__ == '__main__':
+    main()
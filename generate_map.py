@@ -0,0 +1,55 @@
+'''
+Generates a random map (see robodude/map/MapGenerator.py) and writes it to a file.
+
+Usage:
+python generate_map.py <rows>x<cols> <output file> [--seed N] [--connectivity X] [--blocks X]
+                       [--enemies X] [--potions X] [--ammo X] [--gates N]
+
+--connectivity - fraction of the walls between corridors to knock out (default 0.1)
+--blocks - the highest fraction of the inside of the map that stays solid (default 0.5)
+--enemies, --potions, --ammo - fraction of the floor covered by each entity (defaults 0.02, 0.01, 0.01)
+--gates - the number of gates (default 1)
+'''
+
+import sys
+from robodude.map.MapGenerator import MapGenerator
+
+
+# option -> (MapGenerator parameter, type)
+OPTIONS = {
+    '--seed': ('seed', int),
+    '--connectivity': ('connectivity', float),
+    '--blocks': ('block_density', float),
+    '--enemies': ('enemies', float),
+    '--potions': ('potions', float),
+    '--ammo': ('ammo', float),
+    '--gates': ('gates', int),
+}
+
+
+def main():
+    args = sys.argv[1:]
+    params = dict()
+    try:
+        for option, (param, cast) in OPTIONS.items():
+            if option in args and args.index(option) + 1 < len(args):
+                i = args.index(option)
+                params[param] = cast(args[i + 1])
+                del args[i:i + 2]
+        if len(args) != 2:
+            raise ValueError(args)
+        rows, cols = (int(v) for v in args[0].split('x'))
+    except ValueError:  # Wrong number of arguments, malformed size or option value
+        print(__doc__)
+        sys.exit(1)
+
+    try:
+        MapGenerator(rows, cols, **params).write(args[1])
+    except ValueError as e:
+        print(f"Can't generate a {rows}x{cols} map: {e}")
+        sys.exit(1)
+    print(f"{rows}x{cols} map written to '{args[1]}'.")
+
+
+if __name__ == '__main__':
+    main()
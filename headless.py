@@ -0,0 +1,88 @@
+'''
+Runs the dungeon movement, collision and interaction logic without a window and without
+frame limiting, driven by a seeded random walk, and reports the tick throughput.
+
+Usage:
+python headless.py <id of map> [ticks] [--render] [--shared]
+
+--render also renders every tick (to SDL's dummy video driver).
+--shared memory-maps the compiled map (see compile_maps.py), so simulations running
+in parallel on the same map share its static data.
+'''
+
+import os
+import sys
+import time
+import random
+
+os.environ['SDL_VIDEODRIVER'] = 'dummy'  # Must be set before pygame initializes the display
+
+import pygame
+from pygame.locals import *
+from robodude.characters.Player import Player
+from robodude.map.Dungeon import Dungeon
+from main import find_map
+
+
+ARROWS = (K_RIGHT, K_LEFT, K_UP, K_DOWN)
+
+
+def simulate(mapfile, ticks=10000, render=False, seed=0, shared_map=False):
+    '''
+    Advances the dungeon 'ticks' times as fast as possible.
+
+    Returns:
+    dict: the number of ticks, elapsed seconds, ticks per second and what happened in the dungeon
+    '''
+    pygame.init()
+    rng = random.Random(seed)
+
+    player = Player('Jimmy', 'The Spelunker')
+    dungeon = Dungeon(mapfile, player, headless=True, shared_map=shared_map)
+    dungeon.spawn_player()
+
+    held = []
+    next_change = 0
+
+    start = time.perf_counter()
+    for tick in range(ticks):
+        # Random walk: every now and then release the held arrows and press new ones
+        if tick == next_change:
+            for key in held:
+                dungeon.handle_event(pygame.event.Event(KEYUP, key=key))
+            held = rng.sample(ARROWS, rng.randint(1, 2))
+            for key in held:
+                dungeon.handle_event(pygame.event.Event(KEYDOWN, key=key))
+            next_change += rng.randint(10, 60)
+
+        dungeon.update_movement()
+        dungeon.update_interractions()
+        if render:
+            dungeon.render()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'ticks': ticks,
+        'seconds': elapsed,
+        'ticks_per_second': ticks / elapsed if elapsed > 0 else float('inf'),
+        'consumed': dict(dungeon.consumed),
+        'victories': dungeon.victories
+    }
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    if len(args) not in (1, 2):
+        print(__doc__)
+        return
+
+    ticks = int(args[1]) if len(args) == 2 else 10000
+    result = simulate(find_map(args[0]), ticks, render='--render' in sys.argv, shared_map='--shared' in sys.argv)
+
+    print(f"{result['ticks']} ticks in {result['seconds']:.3f}s ({result['ticks_per_second']:.0f} ticks/s)")
+    print(f"Consumed entities: {result['consumed']}, victories: {result['victories']}")
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,99 +1,110 @@
 import pygame
 import sys
 from os import listdir
-from os.path import isfile, join
+from os.path import isfile, join, getmtime
 from pygame.locals import *
 from robodude.characters.Player import Player
 from robodude.map.Dungeon import Dungeon
+from robodude.utils.InputStream import LiveInput, InputRecorder, InputReplay
+from robodude.map.CompiledMap import CompiledMap
+from compile_maps import compiled_path
 
 
-def game(mapfile):
+def find_map(mapid, maps_path="maps/"):
+    '''
+    Returns the path of the first map in 'maps_path' whose file name starts with 'mapid'.\n
+    If the map was compiled (see compile_maps.py) after its last change, in the current format,
+    the compiled map is returned instead.
+    '''
+    mapfile = [maps_path + m for m in listdir(maps_path) if isfile(maps_path + m) and m.startswith(mapid)][0]
+    compiled = compiled_path(mapfile, join(maps_path, "compiled"))
+    if isfile(compiled) and getmtime(compiled) >= getmtime(mapfile) and CompiledMap.is_current(compiled):
+        return compiled
+    return mapfile
+
+
+def game(mapfile, record=None, replay=None, unlimited=False):
+    '''
+    Runs the game on the given map.\n
+    record - file to record the input of the session to\n
+    replay - file (written with 'record') whose input is played back instead of the keyboard\n
+    unlimited - replay as fast as possible instead of in real time
+    '''
     pygame.init()  # Initialize pygame
     pygame.display.set_caption('RoboDude')  # Set the window name/title
 
+    # The input source seeds the randomness, so it has to exist before anything random is created
+    if replay is not None:
+        input_source = InputReplay(replay, unlimited)
+    elif record is not None:
+        input_source = InputRecorder(record)
+    else:
+        input_source = LiveInput()
+
     player = Player('Jimmy', 'The Spelunker')
-    dungeon = Dungeon(mapfile, player)
+    dungeon = Dungeon(mapfile, player, input_source=input_source)
     dungeon.spawn_player()
     # dungeon.outline_solid_collision()
     # dungeon.outline_entity_collision()
+    # dungeon.enable_dirty_rendering()
+
+    try:
+        while True:
+            # MOVE PLAYER
+            dungeon.update_movement()
 
-    while True:
-        # MOVE PLAYER
-        if dungeon.player.moving_right:
-            dungeon.player.x += dungeon.player.velocity
-            if (dungeon.check_for_border_collision() or
-                    dungeon.check_for_collision(dungeon.player.hitbox, tile='blocks')):
-                dungeon.player.x -= dungeon.player.velocity
-        if dungeon.player.moving_left:
-            dungeon.player.x -= dungeon.player.velocity
-            if (dungeon.check_for_border_collision() or
-                    dungeon.check_for_collision(dungeon.player.hitbox, tile='blocks')):
-                dungeon.player.x += dungeon.player.velocity
-        if dungeon.player.moving_up:
-            dungeon.player.y -= dungeon.player.velocity
-            if (dungeon.check_for_border_collision() or
-                    dungeon.check_for_collision(dungeon.player.hitbox, tile='blocks')):
-                dungeon.player.y += dungeon.player.velocity
-        if dungeon.player.moving_down:
-            dungeon.player.y += dungeon.player.velocity
-            if (dungeon.check_for_border_collision() or
-                    dungeon.check_for_collision(dungeon.player.hitbox, tile='blocks')):
-                dungeon.player.y -= dungeon.player.velocity
-
-        # GET NEXT INPUT
-        for event in pygame.event.get():
-            if event.type == QUIT:  # Check for window quit (when X is pressed)
-                pygame.quit()  # stop pygame
-                sys.exit()  # stop the script
-            if event.type == KEYDOWN:  # when a key is PRESSED down (not held)
-                if event.key == K_RIGHT:
-                    dungeon.player.moving_right = True
-                if event.key == K_LEFT:
-                    dungeon.player.moving_left = True
-                if event.key == K_UP:
-                    dungeon.player.moving_up = True
-                if event.key == K_DOWN:
-                    dungeon.player.moving_down = True
-            if event.type == KEYUP:  # when a key is released (unpressed)
-                if event.key == K_RIGHT:
-                    dungeon.player.moving_right = False
-                if event.key == K_LEFT:
-                    dungeon.player.moving_left = False
-                if event.key == K_UP:
-                    dungeon.player.moving_up = False
-                if event.key == K_DOWN:
-                    dungeon.player.moving_down = False
-
-        dungeon.update_interractions()
-
-        # DISPLAY CHANGES
-        dungeon.render()
-        pygame.display.update()  # Update screen (refresh)
-        dungeon.clock.tick(60)  # Framerate
+            # GET NEXT INPUT
+            for event in input_source.get():
+                if event.type == QUIT:  # Check for window quit (when X is pressed)
+                    pygame.quit()  # stop pygame
+                    sys.exit()  # stop the script
+                dungeon.handle_event(event)
+
+            dungeon.update_interractions()
+
+            # DISPLAY CHANGES
+            dungeon.render()
+            dungeon.update_display()  # Update screen (refresh)
+            input_source.tick(dungeon.clock, 60)  # Framerate
+    finally:
+        # The session can also end inside a battle, so the summary is printed on the way out
+        if replay is not None:
+            stats = input_source.stats()
+            print(f"Replay finished: {stats['frames']} frames in {stats['seconds']:.3f}s ({stats['frames_per_second']:.0f} frames/s)")
 
 
 def main():
-    if len(sys.argv) == 1:
+    args = sys.argv[1:]
+    options = dict()
+    unlimited = '--unlimited' in args
+    if unlimited:
+        args.remove('--unlimited')
+    for option in ('--record', '--replay'):
+        if option in args and args.index(option) + 1 < len(args):
+            i = args.index(option)
+            options[option] = args[i + 1]
+            del args[i:i + 2]
+
+    if len(args) == 0:
         maps_path = "maps/"
         maps = [m for m in listdir(maps_path) if isfile(maps_path + m)]
         print("\n====================================================")
         print("Select map to play by typing: ")
         print("\"python main.py <id of map>\"")
+        print("\nTo record or replay a session add:")
+        print("\"--record <file>\" or \"--replay <file> [--unlimited]\"")
         print("\nCurrently available maps:")
         for m in maps:
             print(m)
         print("====================================================")
 
-    if len(sys.argv) > 2:
+    if len(args) > 1 or (unlimited and '--replay' not in options) or len(options) > 1:
         print("\n====================================================")
         print("Error. Type \"python main.py\" for help.")
         print("====================================================")
 
-    if len(sys.argv) == 2:
-        mapid = sys.argv[1]
-        maps_path = "maps/"
-        map = [maps_path + m for m in listdir(maps_path) if isfile(maps_path + m) and m.startswith(mapid)][0]
-        game(map)
+    elif len(args) == 1:
+        game(find_map(args[0]), options.get('--record'), options.get('--replay'), unlimited)
 
 
 if __name__ == '__main__':
@@ -1,10 +1,9 @@
-import pygame
 import random
 
 
 from ..map.Battle import Battle
 from ..utils.AnimatedSpriteSheet import AnimatedSpriteSheet
-from ..utils import utils
+from ..utils.AssetCache import AssetCache
 
 
 class Battle_Ninja:
@@ -14,19 +13,28 @@ class Battle_Ninja:
             "Tywin Lannister", "King Eredin", "Thanos", "Epic Games Representative", "Tod Howard", 
             "Howard the Alien", "SCREAAAAAAAAAAAM", "bitconnect", "Emhyr var Emreis"]
 
+    # Battle spritesheets - attribute: (filename, rows, cols, w, h, animation_speed)
+    battle_sheets = {
+        'ss_idle': ('media/enemy01/10_idle_left_spritesheet.png', 1, 10, -1, 490, 12),
+        'ss_melee': ('media/enemy01/10_attack_left_spritesheet.png', 1, 10, -1, Battle.battle_h556, 5),
+        'ss_critical_melee': ('media/enemy01/14jump_melee_left_spritesheet.png', 1, 14, -1, Battle.battle_h556, 6),
+        'ss_death': ('media/enemy01/10_death_left_spritesheet.png', 1, 10, -1, Battle.battle_h512, 10)
+    }
+    # (filename, w, h)
+    dead_image = ('media/enemy01/death_last_frame.png', -1, Battle.battle_h556)
+
     def __init__(self, health=75, damage=20, crit_chance=30, game_fps=60):
         # =============== General ===============
         self.name = self.__class__.names[random.randint(0, len(Battle_Ninja.names) - 1)]
 
 
         # =============== Images ===============
-        dead = pygame.image.load('media\\enemy01\\death_last_frame.png')
-        self.dead = pygame.transform.smoothscale(dead, (utils.get_proportional(dead.get_size(), Battle.battle_h556, width=False), Battle.battle_h556))
+        self.dead = None
+        self.load_images()
+        AssetCache.shared().subscribe(self.load_images)
 
-        self.ss_idle = AnimatedSpriteSheet('media\\enemy01\\10_idle_left_spritesheet.png', rows=1, cols=10, w=-1, h=490, animation_speed=12)
-        self.ss_melee = AnimatedSpriteSheet('media\\enemy01\\10_attack_left_spritesheet.png', rows=1, cols=10, w=-1, h=Battle.battle_h556, animation_speed=5)
-        self.ss_critical_melee = AnimatedSpriteSheet('media\\enemy01\\14jump_melee_left_spritesheet.png', rows=1, cols=14, w=-1, h=Battle.battle_h556, animation_speed=6)
-        self.ss_death = AnimatedSpriteSheet('media\\enemy01\\10_death_left_spritesheet.png', rows=1, cols=10, w=-1, h=Battle.battle_h512, animation_speed=10)
+        for attr, (filename, rows, cols, w, h, speed) in Battle_Ninja.battle_sheets.items():
+            setattr(self, attr, AnimatedSpriteSheet(filename, rows=rows, cols=cols, w=w, h=h, animation_speed=speed))
 
 
         # =============== Gameplay ===============
@@ -38,6 +46,25 @@ class Battle_Ninja:
 
         self.healthpool = health
 
+    def load_images(self):
+        '''
+        (Re)fetches the images from the AssetCache
+        (called again when the display mode changes, so they are in the display pixel format).
+        '''
+
+        self.dead = AssetCache.shared().image(*Battle_Ninja.dead_image)
+
+    @classmethod
+    def prefetch_assets(cls):
+        '''
+        Starts loading the battle assets on a worker thread (see AssetCache),
+        so the first Battle_Ninja can be created without a hitch.
+        '''
+
+        for filename, rows, cols, w, h, speed in cls.battle_sheets.values():
+            AnimatedSpriteSheet.prefetch(filename, rows, cols, w, h)
+        AssetCache.shared().prefetch_image(*cls.dead_image)
+
     @staticmethod
     def randomNinja():
         '''
@@ -50,11 +77,6 @@ class Battle_Ninja:
 
         return Battle_Ninja(health, damage, crit_chance)
 
-    def animations_update(self):
-        self.ss_idle.animation_update()
-        self.ss_melee.animation_update()
-        self.ss_critical_melee.animation_update()
-        self.ss_death.animation_update()
 
     # $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$ Gameplay $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$
 
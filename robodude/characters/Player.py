@@ -4,7 +4,7 @@ import random
 
 from ..map.Battle import Battle
 from ..utils.AnimatedSpriteSheet import AnimatedSpriteSheet
-from ..utils import utils
+from ..utils.AssetCache import AssetCache
 
 
 class Player:
@@ -24,6 +24,18 @@ class Player:
     crit_meter (non-negative number): Inflicting damage fills this meter. When full it stores a critical attack that can be activated by the player at will\n
     """
 
+    # Battle spritesheets - attribute: (filename, rows, cols, w, h, animation_speed)
+    battle_sheets = {
+        'ss_idle': ('media/player01/10_idle_right_spritesheet.png', 1, 10, -1, Battle.battle_h556, 12),
+        'ss_melee': ('media/player01/8_melee_right_spritesheet.png', 1, 8, -1, Battle.battle_h556, 5),
+        'ss_ranged': ('media/player01/4_shoot_right_spritesheet.png', 1, 4, -1, Battle.battle_h556, 5),
+        'ss_critical_melee': ('media/player01/14_jump_melee_right_spritesheet.png', 1, 14, -1, Battle.battle_h556, 4),
+        'ss_critical_ranged': ('media/player01/4_shoot_right_spritesheet.png', 1, 4, -1, Battle.battle_h556, 6),
+        'ss_death': ('media/player01/10_death_right_spritesheet.png', 1, 10, -1, Battle.battle_h556, 10)
+    }
+    # (filename, w, h)
+    dead_image = ('media/player01/death_last_frame.png', -1, Battle.battle_h556)
+
     def __init__(self, name, title, health=100, melee=18,
                  ranged=25, aim=80, ammo=5,
                  melee_crit=35, ranged_crit=25, crit_meter=5, game_fps=60):
@@ -41,20 +53,17 @@ class Player:
 
 
         # =============== Images ===============
-        icon_right = pygame.image.load('media\\icons01\\player_icon_right_128.png')
-        icon_left = pygame.image.load('media\\icons01\\player_icon_left_128.png')
-        self.icon_right = pygame.transform.smoothscale(icon_right, (self.w, self.h))
-        self.icon_left = pygame.transform.smoothscale(icon_left, (self.w, self.h))
-
-        dead = pygame.image.load('media\\player01\\death_last_frame.png')
-        self.dead = pygame.transform.smoothscale(dead, (utils.get_proportional(dead.get_size(), Battle.battle_h556, width=False), Battle.battle_h556))
+        self.dead = None  # Battle asset, see 'load_battle_assets()'
+        self.icon_right = None
+        self.icon_left = None
+        self.last_direction = None
+        self.load_images()
+        AssetCache.shared().subscribe(self.load_images)
 
-        self.ss_idle = AnimatedSpriteSheet('media\\player01\\10_idle_right_spritesheet.png', rows=1, cols=10, w=-1, h=Battle.battle_h556, animation_speed=12)
-        self.ss_melee = AnimatedSpriteSheet('media\\player01\\8_melee_right_spritesheet.png', rows=1, cols=8, w=-1, h=Battle.battle_h556, animation_speed=5)
-        self.ss_ranged = AnimatedSpriteSheet('media\\player01\\4_shoot_right_spritesheet.png', rows=1, cols=4, w=-1, h=Battle.battle_h556, animation_speed=5)
-        self.ss_critical_melee = AnimatedSpriteSheet('media\\player01\\14_jump_melee_right_spritesheet.png', rows=1, cols=14, w=-1, h=Battle.battle_h556, animation_speed=4)
-        self.ss_critical_ranged = AnimatedSpriteSheet('media\\player01\\4_shoot_right_spritesheet.png', rows=1, cols=4, w=-1, h=Battle.battle_h556, animation_speed=6)
-        self.ss_death = AnimatedSpriteSheet('media\\player01\\10_death_right_spritesheet.png', rows=1, cols=10, w=-1, h=Battle.battle_h556, animation_speed=10)
+        # Battle assets are loaded in the background and resolved by 'load_battle_assets()'
+        for attr in Player.battle_sheets:
+            setattr(self, attr, None)
+        Player.prefetch_assets()
 
 
         # =============== Gameplay Configs ===============
@@ -76,7 +85,6 @@ class Player:
         self.healthpool = health
         self.ammo = ammo
         self.critical_meter = 0
-        self.last_direction = self.icon_right
 
 
         # =============== Positioning and Movement ===============
@@ -111,37 +119,65 @@ class Player:
         self.loc['y'] = val
         self.update_collision()
 
-    def render(self, screen):
+    def render(self, screen, offset=(0, 0)):
         '''
         You must call the 'spawn' method first,
-        before attempting to render the player.
+        before attempting to render the player.\n
+        'offset' is subtracted from the player's position (see the Dungeon's camera).
         '''
         if (self.x is not None and
             self.y is not None):
 
+            pos = (self.x - offset[0], self.y - offset[1])
             if self.moving_right:
-                screen.blit(self.icon_right, (self.x, self.y))
+                screen.blit(self.icon_right, pos)
                 self.last_direction = self.icon_right
             elif self.moving_left:
-                screen.blit(self.icon_left, (self.x, self.y))
+                screen.blit(self.icon_left, pos)
                 self.last_direction = self.icon_left
             else:
-                screen.blit(self.last_direction, (self.x, self.y))
+                screen.blit(self.last_direction, pos)
 
             if self.show_collision:
-                pygame.draw.rect(screen, (0, 255, 0), self.hitbox, 2)
+                pygame.draw.rect(screen, (0, 255, 0), pygame.Rect(self.hitbox).move(-offset[0], -offset[1]), 2)
+
+    def load_images(self):
+        '''
+        (Re)fetches the dungeon icons from the AssetCache
+        (called again when the display mode changes, so they are in the display pixel format).
+        '''
+
+        facing_left = self.last_direction is not None and self.last_direction is self.icon_left
+        self.icon_right = AssetCache.shared().image('media/icons01/player_icon_right_128.png', self.w, self.h)
+        self.icon_left = AssetCache.shared().image('media/icons01/player_icon_left_128.png', self.w, self.h)
+        self.last_direction = self.icon_left if facing_left else self.icon_right
+
+        if self.dead is not None:
+            self.dead = AssetCache.shared().image(*Player.dead_image)
 
-    def animations_update(self):
+    @classmethod
+    def prefetch_assets(cls):
         '''
-        Ticks the animations of every sprite sheet (that is added manually).
+        Starts loading the battle assets on a worker thread (see AssetCache).
         '''
 
-        self.ss_idle.animation_update()
-        self.ss_melee.animation_update()
-        self.ss_ranged.animation_update()
-        self.ss_critical_melee.animation_update()
-        self.ss_critical_ranged.animation_update()
-        self.ss_death.animation_update()
+        for filename, rows, cols, w, h, speed in cls.battle_sheets.values():
+            AnimatedSpriteSheet.prefetch(filename, rows, cols, w, h)
+        AssetCache.shared().prefetch_image(*cls.dead_image)
+
+    def load_battle_assets(self):
+        '''
+        Resolves the battle assets (waiting for the background loading if it hasn't finished yet).\n
+        Must be called before the player enters a Battle. Does nothing if the assets are already loaded.
+        '''
+
+        if self.dead is not None:
+            return
+
+        for attr, (filename, rows, cols, w, h, speed) in Player.battle_sheets.items():
+            setattr(self, attr, AnimatedSpriteSheet(filename, rows=rows, cols=cols, w=w, h=h, animation_speed=speed))
+
+        self.dead = AssetCache.shared().image(*Player.dead_image)
 
 
 
@@ -4,6 +4,11 @@ import random
 
 
 from pygame.locals import *
+from ..utils.AssetCache import AssetCache
+from ..utils.TextCache import TextCache
+from ..utils.AnimationScheduler import AnimationScheduler
+from ..utils.AnimatedSpriteSheet import AnimatedSpriteSheet
+from ..utils.InputStream import LiveInput
 
 
 class Battle:
@@ -17,7 +22,7 @@ class Battle:
 
     # $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$ Setup and Resizing $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$
 
-    def __init__(self, player, ui, enemy, clock, player_vertical_offset, enemy_vertical_offset, fps):
+    def __init__(self, player, ui, enemy, clock, player_vertical_offset, enemy_vertical_offset, fps, input_source=None):
         # =============== Configs ===============
         self.size = (1600, 900)
         self.inputs = {
@@ -39,14 +44,18 @@ class Battle:
 
         self.quickmode = False
 
+        # Plays the one-shot attack and death animations inside the 'fight()' loop
+        self.animations = AnimationScheduler()
+
         # =============== Gameplay ===============
-        self.screen = pygame.display.set_mode(self.size, 0, 32)
+        self.screen = AssetCache.shared().set_display_mode(self.size, 0, 32)
         self.player = player
         self.enemy = enemy
         self.ui = ui
         self.ui.update_width(self.size[0])
         self.clock = clock
         self.fps = fps
+        self.input = input_source if input_source is not None else LiveInput(fps)  # Where events come from (see InputStream)
         self.player_position = (200, self.size[1] - player_vertical_offset)
         self.enemy_position = (800, self.size[1] - enemy_vertical_offset)
 
@@ -57,6 +66,10 @@ class Battle:
         self.font = pygame.font.Font('freesansbold.ttf', 32)
         self.small_font = pygame.font.Font('freesansbold.ttf', 18)
 
+        # The caption, enemy health and confirmation lines are rasterized only when their text changes
+        self.text_cache = TextCache(self.small_font, max_entries=16)
+        self.caption_cache = TextCache(self.font, max_entries=4)
+
         self.background_color = (64, 48, 48)
         self.menu_color = (15, 15 ,15)
         self.caption_color = (5, 5, 5)
@@ -114,17 +127,17 @@ class Battle:
         check_vitals = True
 
         while (True):
-            for event in pygame.event.get():
+            for event in self.input.get():
                 if event.type == QUIT:  # Check for window quit (when X is pressed)
                     pygame.quit()  # stop pygame
                     sys.exit()  # stop the script
 
                 elif event.type == self.ENEMY_RESPONSE:
-                    pygame.time.set_timer(self.ENEMY_RESPONSE, 0)
+                    self.input.set_timer(self.ENEMY_RESPONSE, 0)
                     self.enemy_action_melee()
 
                 elif event.type == self.EXIT:
-                    pygame.time.set_timer(self.EXIT, 0)
+                    self.input.set_timer(self.EXIT, 0)
                     if self.player.is_dead():
                         return False
                     else:
@@ -169,8 +182,11 @@ class Battle:
                         elif event.key == K_n:
                             self.set_state("Get Input")
 
-            self.render()
-            self.clock.tick(self.fps)
+            # Animations are played as tasks of this loop, so events are still handled and the framerate is kept
+            self.render(display_update=False)
+            self.animations.render(self.screen)
+            pygame.display.update()
+            self.input.tick(self.clock, self.fps)
 
 
 
@@ -219,9 +235,9 @@ class Battle:
             self.screen.blit(line, pos)
 
         if not inspect:
-            confirm = self.small_font.render("Confirm this action? Y / N", True, (126, 32, 32))
+            confirm = self.text_cache.render("Confirm this action? Y / N", (126, 32, 32))
         else:
-            confirm = self.small_font.render("Press N to return to menu.", True, (126, 32, 32))
+            confirm = self.text_cache.render("Press N to return to menu.", (126, 32, 32))
 
         confirm_rect = confirm.get_rect()
         confirm_rect.center = (self.size[0] // 2, self.ui.h + 5 + len(self.action_info) * self.small_font.get_linesize())
@@ -229,6 +245,8 @@ class Battle:
         self.screen.blit(confirm, confirm_rect)
 
     def render(self, display_update=True):
+        AnimatedSpriteSheet.clock.update()  # Every sheet resolves its frame from the time latched here
+
         self.screen.fill(self.background_color)
         self.ui.render(self.screen)
 
@@ -263,25 +281,20 @@ class Battle:
                 self.player.ss_idle.render(self.screen, self.player_position[0], self.player_position[1])
                 self.screen.blit(self.enemy.dead, (self.enemy_position[0], self.enemy_position[1]))
 
-        txt_enemy_health = self.small_font.render(f"Helath: {self.enemy.healthpool} / {self.enemy.max_health}", True, self.menu_color)
+        txt_enemy_health = self.text_cache.render(f"Helath: {self.enemy.healthpool} / {self.enemy.max_health}", self.menu_color)
         txt_enemy_health_rect = pygame.Rect(self.enemy_position[0] + self.enemy.ss_idle.frame_width // 2, self.enemy_position[1] - 30, txt_enemy_health.get_size()[0], txt_enemy_health.get_size()[1])
 
         self.screen.blit(txt_enemy_health, txt_enemy_health_rect)
 
-        caption = self.font.render(self.action_caption, True, self.caption_color)
+        caption = self.caption_cache.render(self.action_caption, self.caption_color)
         caption_rect = caption.get_rect()
         caption_rect.center = (self.size[0] // 2, self.size[1] - 50)
 
         self.screen.blit(caption, caption_rect)
 
-        self.animations_update()
         if display_update:
             pygame.display.update()
 
-    def animations_update(self):
-        self.player.animations_update()
-        self.enemy.animations_update()
-
 
 
 
@@ -463,21 +476,14 @@ class Battle:
         damage, critflag = self.player.deal_melee_damage()
 
         if critflag is False:
-            self.player.ss_melee.setup_animate_once_loop()
-            done = False
-            while not done:
-                self.render(display_update=False)
-                done = self.player.ss_melee.animate_once_loop(self.screen, self.player_position[0], self.player_position[1])
-                pygame.display.update()
-
+            sheet = self.player.ss_melee
         elif critflag is True:
-            self.player.ss_critical_melee.setup_animate_once_loop()
-            done = False
-            while not done:
-                self.render(display_update=False)
-                done = self.player.ss_critical_melee.animate_once_loop(self.screen, self.player_position[0], self.player_position[1])
-                pygame.display.update()
+            sheet = self.player.ss_critical_melee
+
+        self.animations.play(sheet, self.player_position[0], self.player_position[1],
+                             on_done=lambda: self.resolve_attack_melee(damage, critflag))
 
+    def resolve_attack_melee(self, damage, critflag):
         self.enemy.take_damage(damage)
         self.player.increment_critical_meter()
 
@@ -486,11 +492,7 @@ class Battle:
         else:
             self.action_caption = f"{self.player.name} {self.player.title} hit {self.enemy.name} for {damage} damage!"
 
-        if self.enemy.is_dead():
-            self.enemy_action_death()
-        else:
-            pygame.time.set_timer(self.ENEMY_RESPONSE, 3000)
-            self.set_state("Downtime")
+        self.end_player_turn()
 
     def action_attack_ranged(self):
         self.set_state("Resolve Action")
@@ -498,22 +500,14 @@ class Battle:
         damage, critflag = self.player.deal_ranged_damage()
 
         if critflag is False:
-            self.player.ss_ranged.setup_animate_once_loop()
-            done = False
-            while not done:
-                self.render(display_update=False)
-                done = self.player.ss_ranged.animate_once_loop(self.screen, self.player_position[0], self.player_position[1])
-                pygame.display.update()
+            self.animations.play(self.player.ss_ranged, self.player_position[0], self.player_position[1],
+                                 on_done=lambda: self.resolve_attack_ranged(damage, critflag))
 
         elif critflag is True:
-            for i in range(3):
-                self.player.ss_critical_ranged.setup_animate_once_loop()
-                done = False
-                while not done:
-                    self.render(display_update=False)
-                    done = self.player.ss_critical_ranged.animate_once_loop(self.screen, self.player_position[0], self.player_position[1])
-                    pygame.display.update()
+            self.animations.play(self.player.ss_critical_ranged, self.player_position[0], self.player_position[1], repeats=3,
+                                 on_done=lambda: self.resolve_attack_ranged(damage, critflag))
 
+    def resolve_attack_ranged(self, damage, critflag):
         self.enemy.take_damage(damage)
         self.player.increment_critical_meter()
         self.player.use_ammo(1)
@@ -525,73 +519,54 @@ class Battle:
         else:
             self.action_caption = f"{self.player.name} {self.player.title} hit {self.enemy.name} for {damage} damage!"
 
-        if self.enemy.is_dead():
-            self.enemy_action_death()
-        else:
-            pygame.time.set_timer(self.ENEMY_RESPONSE, 3000)
-            self.set_state("Downtime")
+        self.end_player_turn()
 
     def action_attack_melee_with_crit(self):
         self.set_state("Resolve Action")
 
         damage, critflag = self.player.deal_melee_damage(crit=True)
 
-        self.player.ss_critical_melee.setup_animate_once_loop()
-        done = False
-        while not done:
-            self.render(display_update=False)
-            done = self.player.ss_critical_melee.animate_once_loop(self.screen, self.player_position[0], self.player_position[1])
-            pygame.display.update()
-
-        self.enemy.take_damage(damage)
-        self.player.empty_critical_meter()
-
-        self.action_caption = f"{self.player.name} {self.player.title} dealt a Critical Strike to {self.enemy.name} for {damage} damage!"
-
-        if self.enemy.is_dead():
-            self.enemy_action_death()
-        else:
-            pygame.time.set_timer(self.ENEMY_RESPONSE, 3000)
-            self.set_state("Downtime")
+        self.animations.play(self.player.ss_critical_melee, self.player_position[0], self.player_position[1],
+                             on_done=lambda: self.resolve_attack_with_crit(damage, ranged=False))
 
     def action_attack_ranged_with_crit(self):
         self.set_state("Resolve Action")
 
         damage = self.player.deal_ranged_damage(crit=True)[0]
 
-        for i in range(3):
-            self.player.ss_critical_ranged.setup_animate_once_loop()
-            done = False
-            while not done:
-                self.render(display_update=False)
-                done = self.player.ss_critical_ranged.animate_once_loop(self.screen, self.player_position[0], self.player_position[1])
-                pygame.display.update()
+        self.animations.play(self.player.ss_critical_ranged, self.player_position[0], self.player_position[1], repeats=3,
+                             on_done=lambda: self.resolve_attack_with_crit(damage, ranged=True))
 
+    def resolve_attack_with_crit(self, damage, ranged):
         self.enemy.take_damage(damage)
         self.player.empty_critical_meter()
-        self.player.use_ammo(1)
+        if ranged:
+            self.player.use_ammo(1)
 
         self.action_caption = f"{self.player.name} {self.player.title} dealt a Critical Strike to {self.enemy.name} for {damage} damage!"
 
+        self.end_player_turn()
+
+    def end_player_turn(self):
+        '''
+        Called once the player's action has resolved: either the enemy dies or it gets to respond.
+        '''
         if self.enemy.is_dead():
             self.enemy_action_death()
         else:
-            pygame.time.set_timer(self.ENEMY_RESPONSE, 3000)
+            self.input.set_timer(self.ENEMY_RESPONSE, 3000)
             self.set_state("Downtime")
 
     def action_death(self):
         self.set_state("Resolve Action")
 
-        self.player.ss_death.setup_animate_once_loop()
-        done = False
-        while not done:
-            self.render(display_update=False)
-            done = self.player.ss_death.animate_once_loop(self.screen, self.player_position[0], self.player_position[1])
-            pygame.display.update()
+        self.animations.play(self.player.ss_death, self.player_position[0], self.player_position[1],
+                             on_done=self.resolve_death)
 
+    def resolve_death(self):
         self.action_caption = f"{self.player.name} {self.player.title} has been slain by {self.enemy.name}!"
 
-        pygame.time.set_timer(self.EXIT, 4000)
+        self.input.set_timer(self.EXIT, 4000)
         self.set_state("Final")
 
     # $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$ Enemy Response Logic $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$
@@ -602,21 +577,14 @@ class Battle:
         damage, critflag = self.enemy.deal_damage()
 
         if critflag is False:
-            self.enemy.ss_melee.setup_animate_once_loop()
-            done = False
-            while not done:
-                self.render(display_update=False)
-                done = self.enemy.ss_melee.animate_once_loop(self.screen, self.enemy_position[0], self.enemy_position[1])
-                pygame.display.update()
-
+            sheet = self.enemy.ss_melee
         elif critflag is True:
-            self.enemy.ss_critical_melee.setup_animate_once_loop()
-            done = False
-            while not done:
-                self.render(display_update=False)
-                done = self.enemy.ss_critical_melee.animate_once_loop(self.screen, self.enemy_position[0], self.enemy_position[1])
-                pygame.display.update()
+            sheet = self.enemy.ss_critical_melee
+
+        self.animations.play(sheet, self.enemy_position[0], self.enemy_position[1],
+                             on_done=lambda: self.resolve_enemy_melee(damage, critflag))
 
+    def resolve_enemy_melee(self, damage, critflag):
         self.player.take_damage(damage)
 
         if critflag:
@@ -632,14 +600,11 @@ class Battle:
     def enemy_action_death(self):
         self.set_state("Resolve Response")
 
-        self.enemy.ss_death.setup_animate_once_loop()
-        done = False
-        while not done:
-            self.render(display_update=False)
-            done = self.enemy.ss_death.animate_once_loop(self.screen, self.enemy_position[0], self.enemy_position[1])
-            pygame.display.update()
+        self.animations.play(self.enemy.ss_death, self.enemy_position[0], self.enemy_position[1],
+                             on_done=self.resolve_enemy_death)
 
+    def resolve_enemy_death(self):
         self.action_caption = f"{self.enemy.name} has been slain by {self.player.name} {self.player.title}!"
 
-        pygame.time.set_timer(self.EXIT, 4000)
+        self.input.set_timer(self.EXIT, 4000)
         self.set_state("Final")
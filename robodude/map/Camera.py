@@ -0,0 +1,66 @@
+import pygame
+
+
+class Camera:
+    '''
+    The part of the map shown in the window, in map coordinates (which include the top bar).\n
+    follow() centers the camera on a rect (the player), but never scrolls past the edges of the map,
+    so a map smaller than the window is always shown whole and never moves.\n
+    Everything is drawn at its map position minus the camera's 'offset'.
+    '''
+
+    def __init__(self, view_size, world_size, top_margin=0):
+        '''
+        Parameters:\n
+        view_size - (width, height) of the window\n
+        world_size - (width, height) of the whole map\n
+        top_margin - height of the part of the window covered by the ui (the rect is centered below it)
+        '''
+        self.x = 0
+        self.y = 0
+        self.top_margin = top_margin
+        self.resize(view_size, world_size)
+
+    def resize(self, view_size, world_size):
+        self.w, self.h = view_size
+        self.world_w, self.world_h = world_size
+        self.move_to(self.x, self.y)
+
+    @property
+    def rect(self):
+        return pygame.Rect(self.x, self.y, self.w, self.h)
+
+    @property
+    def offset(self):
+        return (self.x, self.y)
+
+    def move_to(self, x, y):
+        '''
+        Moves the top left corner of the view to (x, y), clamped to the map.
+
+        Returns:
+        bool: True if the camera moved
+        '''
+        x = max(0, min(x, self.world_w - self.w))
+        y = max(0, min(y, self.world_h - self.h))
+        moved = (x, y) != (self.x, self.y)
+        self.x = x
+        self.y = y
+        return moved
+
+    def follow(self, rect):
+        '''
+        Centers the view (below the top margin) on the rect.
+
+        Returns:
+        bool: True if the camera moved
+        '''
+        rect = pygame.Rect(rect)
+        return self.move_to(rect.centerx - self.w // 2,
+                            rect.centery - self.top_margin - (self.h - self.top_margin) // 2)
+
+    def to_screen(self, rect):
+        '''
+        Returns the rect (in map coordinates) moved to where it is drawn in the window.
+        '''
+        return pygame.Rect(rect).move(-self.x, -self.y)
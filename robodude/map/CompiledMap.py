@@ -0,0 +1,132 @@
+import sys
+import mmap
+import struct
+from array import array
+
+
+from .TileGrid import TileGrid
+
+
+class CompiledMap:
+    '''
+    Binary map format, loaded with a single read instead of being parsed line by line.\n
+    Layout (little-endian):\n
+    header - magic, version, rows, cols, color (r, g, b), player (as in the text map), number of entity tables\n
+    tiles - rows * cols tile codes (see TileGrid), row-major, padded to a multiple of 4 bytes\n
+    entity tables (optional) - for each: tile code, count, then the position (row * cols + col, uint32)
+    of every tile with that code, in ascending order\n
+
+    With load(path, shared=True) the file is memory-mapped read-only instead of read: the tiles and the
+    entity tables are used in place, so every process playing the same map shares the same physical pages.
+    Only the state that changes (the entities in the Dungeon's 'collision_index') is kept per process.\n
+
+    Compile the text maps with compile() (or 'python compile_maps.py'), load them with load()
+    (or let Dungeon.load_map() pick the right loader).
+    '''
+
+    MAGIC = b'RDMP'
+    VERSION = 2
+    HEADER = struct.Struct('<4sHHHBBBHHH')
+    TABLE = struct.Struct('<BxxxI')  # tile code, number of positions (8 bytes, so the positions stay aligned)
+
+    EXTENSION = '.rdm'
+
+    # Tile codes the entity tables are written for
+    ENTITY_CODES = (TileGrid.ENEMY, TileGrid.POTION, TileGrid.AMMO, TileGrid.GATE)
+
+    @staticmethod
+    def is_compiled(path):
+        with open(path, 'rb') as f:
+            return f.read(len(CompiledMap.MAGIC)) == CompiledMap.MAGIC
+
+    @staticmethod
+    def is_current(path):
+        '''
+        Returns True if the file is a compiled map of the version this code writes (and load() reads).
+        '''
+        with open(path, 'rb') as f:
+            header = f.read(CompiledMap.HEADER.size)
+        if len(header) < CompiledMap.HEADER.size:
+            return False
+        magic, version = CompiledMap.HEADER.unpack(header)[:2]
+        return magic == CompiledMap.MAGIC and version == CompiledMap.VERSION
+
+    @staticmethod
+    def compile(mapfile, output, entity_tables=True):
+        '''
+        Parses a text map (see Dungeon.parse()) and writes it in the compiled format.
+        '''
+        from .Dungeon import Dungeon  # Dungeon itself loads compiled maps
+
+        parsed = Dungeon.parse(mapfile)
+        rows, cols = parsed['dimensions']
+        grid = parsed['dungeon']
+        codes = CompiledMap.ENTITY_CODES if entity_tables else ()
+
+        with open(output, 'wb') as f:
+            f.write(CompiledMap.HEADER.pack(CompiledMap.MAGIC, CompiledMap.VERSION, rows, cols,
+                                            *parsed['color'], *parsed['player'], len(codes)))
+            f.write(grid.data)
+            f.write(bytes(CompiledMap.padding(rows, cols)))
+            for code in codes:
+                positions = array('I', (row * cols + col for row, col in grid.positions(code)))
+                if sys.byteorder == 'big':
+                    positions.byteswap()
+                f.write(CompiledMap.TABLE.pack(code, len(positions)))  # The positions are uint32 ('I' is 4 bytes)
+                f.write(positions.tobytes())
+
+    @staticmethod
+    def padding(rows, cols):
+        '''
+        Returns the number of bytes written after the tiles, so the entity tables start at a multiple of 4.
+        '''
+        return -(CompiledMap.HEADER.size + rows * cols) % 4
+
+    @staticmethod
+    def load(path, shared=False):
+        '''
+        Reads a compiled map, or memory-maps it (read-only) if 'shared' is True.
+
+        Returns:
+        dict: the same keys as Dungeon.parse() ('dimensions', 'color', 'player', 'dungeon' as a TileGrid)
+        and 'entities' - tile code -> array of positions (row * cols + col), for every entity table in the file
+        '''
+        with open(path, 'rb') as f:
+            if shared:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = f.read()
+
+        magic, version, rows, cols, r, g, b, player_i, player_j, tables = CompiledMap.HEADER.unpack_from(data)
+        if magic != CompiledMap.MAGIC or version != CompiledMap.VERSION:
+            raise ValueError(f"'{path}' is not a compiled map of a supported version.")
+
+        offset = CompiledMap.HEADER.size
+        if shared:
+            grid = TileGrid.from_buffer(rows, cols, data, offset)
+        else:
+            grid = TileGrid.from_bytes(rows, cols, memoryview(data)[offset:offset + rows * cols])
+        offset += rows * cols + CompiledMap.padding(rows, cols)
+
+        entities = dict()
+        for i in range(tables):
+            code, count = CompiledMap.TABLE.unpack_from(data, offset)
+            offset += CompiledMap.TABLE.size
+            end = offset + count * 4
+            if shared and sys.byteorder == 'little':
+                positions = memoryview(data)[offset:end].cast('I')  # Used in place
+            else:
+                positions = array('I')
+                positions.frombytes(data[offset:end])
+                if sys.byteorder == 'big':
+                    positions.byteswap()
+            entities[code] = positions
+            offset = end
+
+        return {
+            'dimensions': (rows, cols),
+            'color': (r, g, b),
+            'player': (player_i, player_j),
+            'dungeon': grid,
+            'entities': entities
+        }
@@ -1,9 +1,23 @@
 import pygame
 import sys
-import time
+import bisect
+from array import array
+try:
+    import numpy
+except ImportError:  # NumPy is optional, only entity_rects() uses it (see TileGrid.vectorized)
+    numpy = None
+from pygame.locals import *
 from ..utils.AnimatedSpriteSheet import AnimatedSpriteSheet
+from ..utils.SpatialGrid import SpatialGrid
+from ..utils.AssetCache import AssetCache
+from ..utils.InputStream import LiveInput
 from .Ui import Ui
 from .Battle import Battle
+from .StaticLayer import StaticLayer
+from .Camera import Camera
+from .TileAtlas import TileAtlas
+from .TileGrid import TileGrid
+from .CompiledMap import CompiledMap
 from ..characters.Battle_Ninja import Battle_Ninja
 
 
@@ -18,28 +32,44 @@ class Dungeon:
     }
     # The number of the parser-specific arguments
     parser_index_size = len(parser_index)
+    # The map is streamed in and turned into collision data in bands of this many rows (see 'materialize_region()')
+    chunk_rows = 32
 
 
 
 
     # $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$ Setting and Getting $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$
 
-    def __init__(self, mapfile, player, fps=60):
+    def __init__(self, mapfile, player, fps=60, headless=False, input_source=None, shared_map=False, max_window_size=(1600, 960)):
         # =============== Core Data ===============
-        # Holds a list with the position of every tile on the map, sorted by type
+        # Holds a list with the position of every entity on the map, sorted by type
+        # (blocks never change, they are looked up in the 'dungeon' TileGrid directly)
         self.collision_index = {
-            'blocks': [],
             'enemies': [],
             'potions': [],
             'ammo': [],
             'gates': []
         }
+        # Per entity animation phase (frames ahead of the shared sheet), kept parallel to the 'collision_index' lists
+        # of the animated tile types, so entities sharing a sheet don't all animate in lockstep
+        self.animation_phases = {
+            'enemies': array('B')
+        }
+        # Grid buckets over the 'collision_index' (one SpatialGrid per tile type, holding indices), built in 'init_dungeon()'
+        self.spatial_index = dict()
         # List that detemines which tile type is considered an entity (interractable object)
         self.interractable_tiles_index = [
             'enemies', 'potions', 'ammo', 'gates'
         ]
         self.clock = pygame.time.Clock()
         self.fps = fps
+        # In headless mode (simulations and load tests) battles are resolved instantly and reaching the gate respawns the player
+        self.headless = headless
+        self.victories = 0
+        # How many entities of every type were removed from the map so far (see 'remove_entities()')
+        self.consumed = dict.fromkeys(self.interractable_tiles_index, 0)
+        # Where the game loops get their events from (see InputStream), shared with every Battle
+        self.input = input_source if input_source is not None else LiveInput(fps)
 
 
         # =============== Scale and Postion ==========
@@ -53,37 +83,48 @@ class Dungeon:
         self.ammo_scale = (20, 20)
         self.ammo_offset = ((self.map_scale[0] - self.ammo_scale[0]) // 2, (self.map_scale[1] - self.ammo_scale[1]) // 2)
         self.top_bar_height = 40
+        # The tile code (see TileGrid) and the ((offset x, offset y), (w, h)) of every entity type in the 'collision_index'
+        self.tile_codes = {
+            'enemies': TileGrid.ENEMY,
+            'potions': TileGrid.POTION,
+            'ammo': TileGrid.AMMO,
+            'gates': TileGrid.GATE
+        }
+        self.tile_geometry = {
+            'enemies': (self.enemy_icon_offset, self.enemy_icon_scale),
+            'potions': (self.potion_offset, self.potion_scale),
+            'ammo': (self.ammo_offset, self.ammo_scale),
+            'gates': (self.gate_offset, self.gate_scale)
+        }
 
 
         # =============== Art Assets ===============
-        gate_img = pygame.image.load('media/dungeon01/DoorUnlocked.png')
-        block_img = pygame.image.load('media/dungeon01/SolidTile.png')
-        potion_img = pygame.image.load('media/consumables01/health_blob.png')
-        ammo_img = pygame.image.load('media/consumables01/plasma_blob.png')
-
-        self.block_img = pygame.transform.smoothscale(block_img, self.map_scale)
-        self.gate_img = pygame.transform.smoothscale(gate_img, self.gate_scale)
-        self.potion_img = pygame.transform.smoothscale(potion_img, self.potion_scale)
-        self.ammo_img = pygame.transform.smoothscale(ammo_img, self.ammo_scale)
+        self.load_images()
         self.enemy_icon_idle_sprite = AnimatedSpriteSheet('media/enemy01/10_enemy_icon_idle_left_spritesheet.png', rows=1, cols=10, w=self.map_scale[0], h=self.map_scale[1], animation_speed=12)
-
-
-        # =============== Animation Config ===============
-        self.anim_total_frames = 10  # The number of frames the animation consist of
-        self.anim_current_frame = 0  # Index that determines which fram from the spritesheet to be displayed (used in 'animations_update()')
-        self.anim_speed = 20  # Speed of the animation(in fps), aka how many times it loops in 60 fps
-        self.anim_count = 0  # Counter that determines which frame should display (used in 'animations_update()')
+        # Battle assets aren't needed until the first battle, so they are loaded in the background
+        Battle_Ninja.prefetch_assets()
 
 
         # =============== Dynamic Data ===============
         self.player = player
-        parsed = Dungeon.parse(mapfile)
+        # With 'shared_map' compiled maps are memory-mapped, so processes playing the same map share its static data
+        parsed = Dungeon.load_map(mapfile, shared_map)
         self.dimensions = parsed['dimensions']
         self.color = parsed['color']
         player_start_x, player_start_y = self.calc_player_start(parsed['player'])
         self.player_start = (player_start_x, player_start_y + self.top_bar_height)
-        self.dungeon = parsed['dungeon']
-        self.ui = Ui(w=self.dimensions[1] * self.map_scale[0], h=self.top_bar_height, player=self.player)
+        self.dungeon = parsed['dungeon']  # TileGrid, rows are read from the map file as they are needed
+        self.entity_tables = parsed.get('entities', dict())  # Tile code -> sorted positions (row * cols + col), prebuilt by compiled maps
+        self.materialized_chunks = set()  # Row bands of the map whose tiles are in the 'collision_index'
+        # The area the player can move in (see 'move_player()')
+        self.border = pygame.Rect((0, 0), self.calc_dungeon_size())
+        # Maps bigger than this are scrolled through (see 'camera')
+        self.max_window_size = max_window_size
+        self.ui = Ui(w=self.calc_window_size()[0], h=self.top_bar_height, player=self.player)
+        # Pre-composited background, blocks and gates (see 'init_dungeon()')
+        self.static_layer = StaticLayer(self.calc_size(), self.color)
+        # The part of the map shown in the window, follows the player (see 'render()')
+        self.camera = Camera(self.calc_window_size(), self.calc_size(), top_margin=self.top_bar_height)
 
 
         # =============== Debug ===============
@@ -92,50 +133,196 @@ class Dungeon:
         self.show_entity_collision = False
 
 
+        # =============== Dirty Rendering ===============
+        # If True, only the regions that changed since the last frame are redrawn and pushed to the display
+        self.dirty_rendering = False
+        self.dirty_rects = None  # Regions changed by the last 'render()' call (None means the whole window)
+        self._full_redraw = True
+        self._prev_player_rect = None
+        self._prev_enemy_icon_frame = None
+        self._removed_rects = []  # Entities removed since the last frame (their area has to be cleared)
+
+
         # =============== Final ================
-        self.screen = pygame.display.set_mode(self.calc_size(), 0, 32)
+        AssetCache.shared().subscribe(self.on_display_mode_changed)
+        self.screen = AssetCache.shared().set_display_mode(self.calc_window_size(), 0, 32)
 
 
         # =============== Autocalls ===============
         # Enables collision of the map when it's first created
         self.init_dungeon()
 
+    def load_images(self):
+        '''
+        (Re)fetches the tile images from the AssetCache and packs them into the tile atlas.
+        '''
+
+        assets = AssetCache.shared()
+        self.block_img = assets.image('media/dungeon01/SolidTile.png', *self.map_scale)
+        self.gate_img = assets.image('media/dungeon01/DoorUnlocked.png', *self.gate_scale)
+        self.potion_img = assets.image('media/consumables01/health_blob.png', *self.potion_scale)
+        self.ammo_img = assets.image('media/consumables01/plasma_blob.png', *self.ammo_scale)
+        # Every tile image packed into one Surface, so each layer is drawn with a single blits() call
+        self.atlas = TileAtlas({
+            'blocks': self.block_img,
+            'gates': self.gate_img,
+            'potions': self.potion_img,
+            'ammo': self.ammo_img
+        })
+
+    def on_display_mode_changed(self):
+        '''
+        Fetches the images again (in the new display pixel format) and rebuilds the static layer with them.
+        '''
+
+        self.load_images()
+        if self.static_layer.is_valid():
+            self.build_static_layer()
+
     def init_dungeon(self):
             '''
-            Generates the dungeon by filling the 'collision_index' variable\n
-            The 'collision_index' represents the state of the map, while the 'dungeon' variable holds the original state.
+            Resets the 'collision_index' and the 'spatial_index' to the original state of the map
+            and fills them with the entities of the visible part of it (see 'materialize_region()').\n
+            The 'collision_index' represents the state of the map, while the 'dungeon' variable holds the original state.\n
+            Also (re)builds the static layer, so this should be called again whenever the map itself changes.
             '''
 
-            for i, row in enumerate(self.dungeon):
-                i *= self.map_scale[1]
-                i += self.top_bar_height
-                for j, pos in enumerate(row):
-                    j *= self.map_scale[0]
+            for tiles in self.collision_index.values():
+                tiles.clear()
+            for phases in self.animation_phases.values():
+                del phases[:]
+            self.materialized_chunks = set()
+            self.build_spatial_index()
+
+            self.materialize_region(self.viewport_rect())
+            self.build_static_layer()
+
+    def materialize_region(self, rect):
+        '''
+        Makes sure the tiles of every row band ('chunk_rows' rows) the rect overlaps are in the
+        'collision_index' and the 'spatial_index', reading them from the map file first if needed.\n
+        Called with the viewport when the dungeon is initialized, and with the player's hitbox
+        before every collision check, so the rest of the map is only processed once something gets near it.
+        '''
+
+        band_h = self.chunk_rows * self.map_scale[1]
+        first = max(0, (rect[1] - self.top_bar_height) // band_h)
+        last = min((self.dimensions[0] - 1) // self.chunk_rows, (rect[1] + rect[3] - 1 - self.top_bar_height) // band_h)
+        for chunk in range(first, last + 1):
+            if chunk not in self.materialized_chunks:
+                self.materialize_chunk(chunk)
 
-                    if pos == 'B':
-                        self.collision_index['blocks'].append(tuple(
-                            [j, i, self.map_scale[0], self.map_scale[1]]
-                            ))
+    def materialize_chunk(self, chunk):
+        '''
+        Adds the tiles of a single row band to the 'collision_index' and the 'spatial_index'.
+        '''
 
-                    if pos == 'E':
-                        self.collision_index['enemies'].append(tuple(
-                            [j, i, self.map_scale[0], self.map_scale[1]]
-                            ))
+        self.materialized_chunks.add(chunk)
+        first_row, last_row = self.chunk_row_range(chunk)
+        for tile_type in self.tile_codes:
+            self.add_tiles(tile_type, self.entity_rects(tile_type, first_row, last_row))
 
-                    if pos == 'G':
-                        self.collision_index['gates'].append(tuple(
-                            [j, i, self.map_scale[0], self.map_scale[1]]
-                            ))
+        # Gates that were added after the static layer was composited have to be drawn as well
+        if self.static_layer.is_valid():
+            self.static_layer.invalidate(self.chunk_rect(chunk))
+            self.request_full_redraw()
 
-                    if pos == 'P':
-                        self.collision_index['potions'].append(tuple(
-                            [j + self.potion_offset[1], i + self.potion_offset[0], self.potion_scale[0], self.potion_scale[1]]
-                        ))
+    def chunk_row_range(self, chunk):
+        '''
+        Returns the first and the last row (inclusive) of the row band.
+        '''
+        first_row = chunk * self.chunk_rows
+        return first_row, min(first_row + self.chunk_rows, self.dimensions[0]) - 1
 
-                    if pos == 'A':
-                        self.collision_index['ammo'].append(tuple(
-                            [j + self.ammo_offset[1], i + self.ammo_offset[0], self.ammo_scale[0], self.ammo_scale[1]]
-                        ))
+    def chunk_rect(self, chunk):
+        '''
+        Returns the area the row band covers (in map coordinates).
+        '''
+        first_row, last_row = self.chunk_row_range(chunk)
+        return pygame.Rect(0, first_row * self.map_scale[1] + self.top_bar_height,
+                           self.calc_dungeon_size()[0], (last_row - first_row + 1) * self.map_scale[1])
+
+    def entity_rects(self, tile_type, first_row, last_row):
+        '''
+        Returns the rects (in map coordinates) of every entity of the type in the (inclusive) range of rows.\n
+        The positions come from the prebuilt entity table if the map has one, or from searching the 'dungeon'.
+        With NumPy installed they are found and turned into rects in bulk, otherwise one by one.
+        '''
+        code = self.tile_codes[tile_type]
+        (offset_x, offset_y), (w, h) = self.tile_geometry[tile_type]
+        offset_y += self.top_bar_height
+        scale_x, scale_y = self.map_scale
+        cols = self.dimensions[1]
+
+        table = self.entity_tables.get(code)
+        if table is not None:
+            table = table[bisect.bisect_left(table, first_row * cols):bisect.bisect_left(table, (last_row + 1) * cols)]
+
+        if TileGrid.vectorized:
+            if table is None:
+                rows, columns = self.dungeon.position_arrays(code, first_row, last_row)
+            else:
+                rows, columns = numpy.divmod(numpy.frombuffer(table, dtype=numpy.uint32).astype(numpy.int64), cols)
+            xs = (columns * scale_x + offset_x).tolist()
+            ys = (rows * scale_y + offset_y).tolist()
+            return [(x, y, w, h) for x, y in zip(xs, ys)]
+
+        if table is None:
+            positions = self.dungeon.positions(code, first_row, last_row)
+        else:
+            positions = (divmod(position, cols) for position in table)
+        return [(col * scale_x + offset_x, row * scale_y + offset_y, w, h) for row, col in positions]
+
+    def block_rects(self, rect):
+        '''
+        Generator of the rect of every block overlapping the rect (in map coordinates).
+        '''
+        tiles = self.tile_range(rect)
+        if tiles is not None:
+            for row, col in self.dungeon.positions(TileGrid.BLOCK, *tiles):
+                yield (col * self.map_scale[0], row * self.map_scale[1] + self.top_bar_height, self.map_scale[0], self.map_scale[1])
+
+    def add_tiles(self, tile_type, rects):
+        tiles = self.collision_index[tile_type]
+        self.spatial_index[tile_type].insert_many(range(len(tiles), len(tiles) + len(rects)), rects)
+        tiles.extend(rects)
+        if tile_type in self.animation_phases:
+            self.animation_phases[tile_type].extend(self.animation_phase(rect) for rect in rects)
+
+    def animation_phase(self, rect):
+        '''
+        Returns the animation phase (0 - 255) of the entity at the rect, scrambled from its tile
+        so neighbouring entities differ, but the same entity always gets the same one.
+        '''
+        col, row = rect[0] // self.map_scale[0], (rect[1] - self.top_bar_height) // self.map_scale[1]
+        return (col * 73856093 ^ row * 19349663) % 251
+
+    def build_spatial_index(self, tile_type=None):
+        '''
+        (Re)builds the grid buckets of the 'spatial_index' for the given tile type
+        (or for every tile type if none is passed).\n
+        The grid cells match the map scale, so every tile falls into a single cell.
+        '''
+
+        tile_types = self.collision_index.keys() if tile_type is None else [tile_type]
+        for k in tile_types:
+            grid = SpatialGrid(self.map_scale[0], self.map_scale[1], origin=(0, self.top_bar_height))
+            for idx, raw_rect in enumerate(self.collision_index[k]):
+                grid.insert(idx, raw_rect)
+            self.spatial_index[k] = grid
+
+    def build_static_layer(self):
+        '''
+        Registers the background color, blocks and gates with the static layer,
+        so they can be drawn with a few blits every frame (the visible part is composited right away).
+        '''
+
+        self.static_layer.size = self.calc_size()
+        self.static_layer.color = self.color
+        self.static_layer.clear()
+        self.static_layer.add_tiles(self.atlas.surface, self.block_rects, self.atlas.area('blocks'))
+        self.static_layer.add_tiles(self.atlas.surface, self.collision_index['gates'], self.atlas.area('gates'))
+        self.static_layer.build(self.viewport_rect())
 
 
 
@@ -150,7 +337,7 @@ class Dungeon:
         self.player.loc['x'] = self.player_start[0]
         self.player.loc['y'] = self.player_start[1]
         self.player.update_collision()
-        self.player.render(self.screen)
+        self.player.render(self.screen, self.camera.offset)
 
     def render(self):
         '''
@@ -165,71 +352,259 @@ class Dungeon:
         'a' = ammo
         '''
 
-        # Set background color
-        self.screen.fill(self.color)
+        AnimatedSpriteSheet.clock.update()  # Every sheet resolves its frame from the time latched here
 
-        # Render top bar
+        # When the camera scrolls, everything on screen moves
+        if self.camera.follow(self.player_rect()):
+            self.request_full_redraw()
+        self.materialize_region(self.camera.rect)
+
+        if self.dirty_rendering and not self._full_redraw:
+            self.render_dirty()
+            return
+
+        # Background color, blocks and gates (pre-composited), only the visible part
+        self.static_layer.render(self.screen, (0, 0), self.camera.rect)
+
+        self.render_entities()
+        self.render_debug()
+
+        self.player.render(self.screen, self.camera.offset)
+
+        # Render top bar (last, the map scrolls under it)
         self.ui.render(self.screen)
 
-        for tile in self.collision_index['blocks']:
+        # The whole window has to be pushed to the display ('update_display()')
+        self.dirty_rects = None
+        self._full_redraw = False
+        self._prev_player_rect = self.player_rect()
+        self._prev_enemy_icon_frame = self.enemy_icon_idle_sprite.anim_current_frame
+        self._removed_rects = []
 
-            j, i = tile[0], tile[1]
+    def render_dirty(self):
+        '''
+        Dirty rectangle variant of 'render()' (see 'enable_dirty_rendering()').\n
+        Restores the static layer only under the regions that changed since the last frame,
+        redraws the entities overlapping them and stores those regions in 'dirty_rects'.\n
+        The camera doesn't move between dirty frames (see 'render()'), so the regions are collected
+        in map coordinates and moved to the screen at the end.
+        '''
 
-            jpos = j * self.map_scale[1]
-            ipos = i * self.map_scale[0]
-            self.screen.blit(self.block_img, (j, i))
+        player_rect = self.player_rect()
+        dirty = [self._prev_player_rect, player_rect]
+        dirty.extend(self._removed_rects)
 
-        for tile in self.collision_index['gates']:
+        # The enemy icons share one sprite sheet, so they all change frame together
+        enemy_icon_frame = self.enemy_icon_idle_sprite.anim_current_frame
+        if enemy_icon_frame != self._prev_enemy_icon_frame:
+            dirty.extend(pygame.Rect(raw_rect) for raw_rect in self.visible_entities('enemies', self.camera.rect))
 
-            j, i = tile[0], tile[1]
+        # Entities touching a dirty region are redrawn whole, so their whole area has to be restored too
+        dirty.extend(self.entities_touching(dirty))
 
-            jpos = j * self.map_scale[1]
-            ipos = i * self.map_scale[0]
-            self.screen.blit(self.gate_img, (j, i))
+        for rect in dirty:
+            self.static_layer.render(self.screen, self.camera.to_screen(rect).topleft, rect)
 
-        for tile in self.collision_index['enemies']:
+        self.render_entities(dirty)
+        self.render_debug()
 
-            j, i = tile[0], tile[1]
+        self.player.render(self.screen, self.camera.offset)
 
-            jpos = j * self.map_scale[1]
-            ipos = i * self.map_scale[0]
-            self.enemy_icon_idle_sprite.render(self.screen, j, i)
+        dirty = [self.camera.to_screen(rect) for rect in dirty]
+        if self.ui.is_dirty() or pygame.Rect(self.ui.box).collidelist(dirty) != -1:
+            self.ui.render(self.screen)
+            dirty.append(pygame.Rect(self.ui.box))
 
-        for tile in self.collision_index['ammo']:
+        self.dirty_rects = dirty
+        self._prev_player_rect = player_rect
+        self._prev_enemy_icon_frame = enemy_icon_frame
+        self._removed_rects = []
 
-            j, i = tile[0], tile[1]
+    def render_entities(self, dirty=None):
+        '''
+        Renders the enemies, ammo and potions that are in view.\n
+        If a list of rects (in map coordinates) is passed as 'dirty', only the entities overlapping them are drawn.
+        '''
 
-            jpos = j * self.map_scale[1]
-            ipos = i * self.map_scale[0]
-            self.screen.blit(self.ammo_img, (j, i))
+        offset_x, offset_y = self.camera.offset
+        view = self.camera.rect
+
+        # The enemies share one sheet, each a few frames apart (see 'animation_phases')
+        enemies = self.collision_index['enemies']
+        indices = self.visible_indices('enemies', view)
+        if dirty is not None:
+            indices = [idx for idx in indices if pygame.Rect(enemies[idx]).collidelist(dirty) != -1]
+        phases = self.animation_phases['enemies']
+        self.enemy_icon_idle_sprite.render_many(self.screen, [(enemies[idx][0] - offset_x, enemies[idx][1] - offset_y) for idx in indices],
+                                                [phases[idx] for idx in indices])
+
+        # One blits() call per layer
+        for tile_type in ('ammo', 'potions'):
+            tiles = self.visible_entities(tile_type, view)
+            if dirty is not None:
+                tiles = [tile for tile in tiles if pygame.Rect(tile).collidelist(dirty) != -1]
+            self.atlas.render(self.screen, tile_type, tiles, (offset_x, offset_y))
+
+    def visible_entities(self, tile_type, area):
+        '''
+        Returns the rects of the entities of the type that overlap the area (looked up in the 'spatial_index'),
+        in the order they are stored in the 'collision_index'.
+        '''
 
-        for tile in self.collision_index['potions']:
+        tiles = self.collision_index[tile_type]
+        return [tiles[idx] for idx in self.visible_indices(tile_type, area)]
 
-            j, i = tile[0], tile[1]
+    def visible_indices(self, tile_type, area):
+        '''
+        Same as 'visible_entities()', but returns the indices of the entities in the 'collision_index'.
+        '''
 
-            jpos = j * self.map_scale[1]
-            ipos = i * self.map_scale[0]
-            self.screen.blit(self.potion_img, (j, i))
+        tiles = self.collision_index[tile_type]
+        return [idx for idx in sorted(self.spatial_index[tile_type].query(area))
+                if pygame.Rect(tiles[idx]).colliderect(area)]
 
+    def entities_touching(self, rects):
+        '''
+        Returns the rects of every enemy, ammo and potion that overlaps any of the passed rects.
+        '''
+
+        touching = []
+        for tile_type in ('enemies', 'ammo', 'potions'):
+            for rect in rects:
+                touching.extend(pygame.Rect(raw_rect) for raw_rect in self.visible_entities(tile_type, rect))
+        return touching
+
+    def render_debug(self):
+        view = self.camera.rect
         if self.show_solid_collision:
-            for raw_rect in self.collision_index['blocks']:
-                pygame.draw.rect(self.screen, (255, 0, 0), raw_rect, 2)
+            for raw_rect in self.block_rects(view):
+                pygame.draw.rect(self.screen, (255, 0, 0), self.camera.to_screen(raw_rect), 2)
 
         if self.show_entity_collision:
             for tile_type in self.collision_index:
                 if tile_type in self.interractable_tiles_index:
-                    for raw_rect in self.collision_index[tile_type]:
-                        pygame.draw.rect(self.screen, (0, 255, 0), raw_rect, 2)
+                    for raw_rect in self.visible_entities(tile_type, view):
+                        pygame.draw.rect(self.screen, (0, 255, 0), self.camera.to_screen(raw_rect), 2)
+
+    def update_display(self):
+        '''
+        Pushes the last rendered frame to the display.\n
+        In dirty rendering mode only the regions that changed are updated.
+        '''
+
+        if self.dirty_rects is None:
+            pygame.display.update()
+        else:
+            pygame.display.update(self.dirty_rects)
+
+    def request_full_redraw(self):
+        '''
+        Forces the next 'render()' to redraw (and update) the whole window.
+        '''
 
-        self.player.render(self.screen)
-        self.animations_update()
+        self._full_redraw = True
 
-    def animations_update(self):
+
+
+
+
+    # $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$ Movement and Input $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$
+
+    def update_movement(self):
+        '''
+        Moves the player one step in the direction it is moving in (see 'move_player()').
+        '''
+
+        dx = (self.player.moving_right - self.player.moving_left) * self.player.velocity
+        dy = (self.player.moving_down - self.player.moving_up) * self.player.velocity
+        if dx or dy:
+            self.move_player(dx, dy)
+
+    def move_player(self, dx, dy):
+        '''
+        Moves the player by (dx, dy) - first horizontally, then vertically.
+        On each axis the player stops flush against the first block or border in its way,
+        no matter how long the step is (see 'sweep()').
+
+        Returns:
+        tuple: the final (x, y) of the player
+        '''
+
+        box = pygame.Rect(self.player.x, self.player.y, self.player.w, self.player.h)
+        if dx:
+            box.x += self.sweep(box, 0, dx)
+        if dy:
+            box.y += self.sweep(box, 1, dy)
+
+        if box.topleft != (self.player.x, self.player.y):
+            self.player.loc['x'], self.player.loc['y'] = box.topleft
+            self.player.update_collision()
+        return box.topleft
+
+    def sweep(self, box, axis, distance):
+        '''
+        Returns how far (signed, at most 'distance') the box can move along the axis (0 - x, 1 - y)
+        before it hits the 'border' or a block.\n
+        Every column (or row) of tiles the box would pass through is tested, nearest first,
+        with a single search of the tile codes each.
+        '''
+
+        low, high = (box.left, box.right) if axis == 0 else (box.top, box.bottom)
+        border_low, border_high = (self.border.left, self.border.right) if axis == 0 else (self.border.top, self.border.bottom)
+        if distance > 0:
+            distance = max(0, min(distance, border_high - high))
+        else:
+            distance = min(0, max(distance, border_low - low))
+
+        tiles = self.tile_range(box)
+        if distance == 0 or tiles is None:
+            return distance
+
+        first_row, last_row, first_col, last_col = tiles
+        scale = self.map_scale[axis]
+        origin = 0 if axis == 0 else self.top_bar_height
+        count = self.dimensions[1 - axis]
+        if distance > 0:
+            lines = range((high - origin) // scale, (high + distance - 1 - origin) // scale + 1)
+        else:
+            lines = range((low - 1 - origin) // scale, (low + distance - origin) // scale - 1, -1)
+
+        for line in lines:
+            if not 0 <= line < count:
+                continue
+            if axis == 0:
+                blocked = self.dungeon.contains(TileGrid.BLOCK, first_row, last_row, line, line)
+            else:
+                blocked = self.dungeon.contains(TileGrid.BLOCK, line, line, first_col, last_col)
+            if blocked:
+                if distance > 0:
+                    return max(0, line * scale + origin - high)
+                return min(0, (line + 1) * scale + origin - low)
+        return distance
+
+    def handle_event(self, event):
         '''
-        Ticks the animations of every sprite sheet (that is added manually).
+        Updates the player's movement flags from arrow key events (other events are ignored).
         '''
 
-        self.enemy_icon_idle_sprite.animation_update()
+        if event.type == KEYDOWN:  # when a key is PRESSED down (not held)
+            if event.key == K_RIGHT:
+                self.player.moving_right = True
+            if event.key == K_LEFT:
+                self.player.moving_left = True
+            if event.key == K_UP:
+                self.player.moving_up = True
+            if event.key == K_DOWN:
+                self.player.moving_down = True
+        if event.type == KEYUP:  # when a key is released (unpressed)
+            if event.key == K_RIGHT:
+                self.player.moving_right = False
+            if event.key == K_LEFT:
+                self.player.moving_left = False
+            if event.key == K_UP:
+                self.player.moving_up = False
+            if event.key == K_DOWN:
+                self.player.moving_down = False
 
 
 
@@ -239,20 +614,36 @@ class Dungeon:
     def check_for_collision(self, box, tile):
         '''
         Return true if the provided rect object ('box')
-        collides with any tile of type 'tile' (where 'tile' is a string
-        present in the collision_index)
+        collides with any tile of type 'tile' (where 'tile' is 'blocks' or a string
+        present in the collision_index).\n
+        Only the tiles in the grid cells the box overlaps are tested.
         '''
 
-        for raw_rect in self.collision_index[tile]:
-            if pygame.Rect(raw_rect).colliderect(box):
+        if tile == 'blocks':
+            return self.collides_with_tile(box, TileGrid.BLOCK)
+
+        self.materialize_region(box)
+        tiles = self.collision_index[tile]
+        for idx in self.spatial_index[tile].query(box):
+            if pygame.Rect(tiles[idx]).colliderect(box):
                 return True
 
+    def collides_with_tile(self, box, code):
+        '''
+        Return true if the box overlaps any tile of the map with the tile code (see TileGrid).
+        Parts of the box outside of the map are ignored.
+        '''
+
+        tiles = self.tile_range(box)
+        if tiles is None:
+            return False
+        return self.dungeon.contains(code, *tiles)
+
     def check_for_border_collision(self):
-        w, h = self.calc_dungeon_size()
-        if (self.player.x < 0 or
-                self.player.x + self.player.w > w or
-                self.player.y < 0 or
-                self.player.y + self.player.h > h):
+        if (self.player.x < self.border.left or
+                self.player.x + self.player.w > self.border.right or
+                self.player.y < self.border.top or
+                self.player.y + self.player.h > self.border.bottom):
             return True
 
 
@@ -263,15 +654,28 @@ class Dungeon:
     def update_interractions(self):
         '''
         Check if player collides with entities and call the interraction index function, 
-        which in turn redirects to the proper function to execute the interraction.
+        which in turn redirects to the proper function to execute the interraction.\n
+        Only the entities in the grid cells around the player are tested. Every hit is collected first
+        and the consumed entities are removed in a single batch afterwards, so the indices stay valid
+        for the whole pass.
         '''
 
-        for k, v in self.collision_index.items():
+        hitbox = self.player.hitbox
+        self.materialize_region(hitbox)
+        hits = []
+        for k in self.interractable_tiles_index:
+            tiles = self.collision_index[k]
+            for idx in sorted(self.spatial_index[k].query(hitbox)):
+                if pygame.Rect(tiles[idx]).colliderect(hitbox):
+                    hits.append((k, idx))
+
+        consumed = dict()
+        for k, idx in hits:
+            if self.execute_interraction_with_player(k, idx):
+                consumed.setdefault(k, []).append(idx)
 
-            if k in self.interractable_tiles_index:
-                for idx, raw_rect in enumerate(self.collision_index[k]):
-                    if pygame.Rect(raw_rect).colliderect(self.player.hitbox):
-                        self.execute_interraction_with_player(k, idx)
+        for k, indices in consumed.items():
+            self.remove_entities(k, indices)
 
     def execute_interraction_with_player(self, tile_type, tile_idx):
         '''
@@ -280,30 +684,69 @@ class Dungeon:
         tile_list_idx - (The value) the index of the specific entity the player is colliding with (also for lookup in the collision_index dict)
 
         Depending on the key (tile_type), decides which function to call, passing it the value (tile_list_idx)
+
+        Returns:
+        bool: True if the entity was consumed and should be removed from the map
         '''
         if tile_type == 'ammo':
-            self.interraction_pick_up_ammo(tile_idx)
+            return self.interraction_pick_up_ammo(tile_idx)
         # elif tile_type == 'enemies':
         #     self.interraction_initiate_fight(tile_list_idx)
         elif tile_type == 'potions':
-            self.interraction_pick_up_health_blob(tile_idx)
+            return self.interraction_pick_up_health_blob(tile_idx)
         elif tile_type == 'gates':
             self.interraction_victory()
         elif tile_type == 'enemies':
-            self.begin_battle(tile_idx)
+            return self.begin_battle(tile_idx)
+        return False
+
+    def remove_entities(self, tile_type, indices):
+        '''
+        Removes the entities at the given indices from the 'collision_index' and marks their area for redrawing.\n
+        Uses swap-remove (the last entity takes the place of the removed one), so every removal is O(1)
+        and only the moved entity has to be re-indexed in the 'spatial_index'.
+        '''
+
+        tiles = self.collision_index[tile_type]
+        grid = self.spatial_index[tile_type]
+        phases = self.animation_phases.get(tile_type)
+        indices = set(indices)
+        self.consumed[tile_type] += len(indices)
+
+        # Going from the highest index down guarantees the moved (last) entity is never one still pending removal
+        for idx in sorted(indices, reverse=True):
+            last = len(tiles) - 1
+            self._removed_rects.append(pygame.Rect(tiles[idx]))
+            grid.remove(idx, tiles[idx])
+            if idx != last:
+                grid.replace(last, idx, tiles[last])
+                tiles[idx] = tiles[last]
+                if phases is not None:
+                    phases[idx] = phases[last]
+            tiles.pop()
+            if phases is not None:
+                phases.pop()
 
     def interraction_pick_up_ammo(self, idx):
         if self.player.ammo < self.player.max_ammo:
             self.player.add_ammo(1)
-            del self.collision_index['ammo'][idx]
+            return True
+        return False
 
     def interraction_pick_up_health_blob(self, idx):
         if self.player.healthpool < self.player.max_health:
             self.player.take_healing(20)
-            del self.collision_index['potions'][idx]
+            return True
+        return False
 
     def interraction_victory(self):
-        w, h = self.calc_dungeon_size()
+        if self.headless:
+            self.victories += 1
+            self.spawn_player()
+            return
+
+        w, h = self.calc_window_size()
+        h -= self.top_bar_height
         font = pygame.font.Font('freesansbold.ttf', 64)
         text = font.render('Victory!', True, (0, 255, 0), self.color)
         text_rect = text.get_rect()
@@ -313,13 +756,17 @@ class Dungeon:
         self.screen.blit(text, text_rect)
         pygame.display.update()
 
-        time.sleep(2)
+        self.input.wait(2)
         pygame.quit()
         sys.exit()
 
     def begin_battle(self, idx):
+        if self.headless:
+            return True  # The player always wins
+
         # =============== Text ===============
-        w, h = self.calc_dungeon_size()
+        w, h = self.calc_window_size()
+        h -= self.top_bar_height
         font = pygame.font.Font('freesansbold.ttf', 64)
 
         intro_txt = font.render("Prepare to fight!", True, (0, 255, 128))
@@ -340,7 +787,7 @@ class Dungeon:
         pygame.draw.rect(self.screen, (32, 32, 32), intro_txt_background)
         self.screen.blit(intro_txt, intro_txt_rect)
         pygame.display.update()
-        time.sleep(1)
+        self.input.wait(1)
 
         # =============== Logic ===============
         self.player.moving_up = False
@@ -348,24 +795,26 @@ class Dungeon:
         self.player.moving_down = False
         self.player.moving_left = False
 
+        self.player.load_battle_assets()
         enemy = Battle_Ninja.randomNinja()
-        battle = Battle(self.player, self.ui, enemy, self.clock, 630, 600, self.fps)
+        battle = Battle(self.player, self.ui, enemy, self.clock, 630, 600, self.fps, self.input)
         player_won = battle.fight()
     
-        w, h = self.calc_size()
-        pygame.display.set_mode((w, h), 0, 32)
+        w, h = self.calc_window_size()
+        self.screen = AssetCache.shared().set_display_mode((w, h), 0, 32)
 
         self.ui.update_width(w)
+        self.request_full_redraw()
 
         if player_won:
-            del self.collision_index['enemies'][idx]
+            return True
 
         else:
             self.screen.fill(self.color)
             self.screen.blit(defeat_txt, defeat_txt_rect)
             pygame.display.update()
 
-            time.sleep(2)
+            self.input.wait(2)
             pygame.quit()
             sys.exit()
 
@@ -399,6 +848,48 @@ class Dungeon:
         return (self.map_scale[0] * self.dimensions[1],
                 self.map_scale[1] * self.dimensions[0] + self.top_bar_height)
 
+    def player_rect(self):
+        '''
+        Returns the area the player icon occupies on screen.
+
+        Returns:
+        pygame.Rect
+        '''
+        return pygame.Rect(self.player.x, self.player.y, self.player.w, self.player.h)
+
+    def calc_window_size(self):
+        '''
+        Returns the size of the window: the size of the level (see 'calc_size()'),
+        but at most 'max_window_size' (the camera scrolls through bigger levels).
+
+        Returns:
+        tuple: width, height (in pixels)
+        '''
+        w, h = self.calc_size()
+        return (min(w, self.max_window_size[0]), min(h, self.max_window_size[1]))
+
+    def viewport_rect(self):
+        '''
+        Returns the part of the map (in map coordinates) shown in the window.
+
+        Returns:
+        pygame.Rect
+        '''
+        return self.camera.rect
+
+    def tile_range(self, rect):
+        '''
+        Returns the (first row, last row, first col, last col) of the map tiles the rect
+        (in map coordinates) overlaps, clipped to the map, or None if it is outside of the map.
+        '''
+        x, y, w, h = rect[0], rect[1] - self.top_bar_height, rect[2], rect[3]
+        rows, cols = self.dimensions
+        first_col, last_col = max(0, x // self.map_scale[0]), min(cols - 1, (x + w - 1) // self.map_scale[0])
+        first_row, last_row = max(0, y // self.map_scale[1]), min(rows - 1, (y + h - 1) // self.map_scale[1])
+        if first_col > last_col or first_row > last_row:
+            return None
+        return first_row, last_row, first_col, last_col
+
     def calc_dungeon_size(self):
         '''
         Returns the size of the dungeon only.
@@ -415,7 +906,17 @@ class Dungeon:
     # $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$ Map Parsing $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$
 
     @classmethod
-    def parse(cls, mapfile):
+    def load_map(cls, mapfile, shared=False):
+        '''
+        Loads a compiled map (see CompiledMap) with a single read (or memory-maps it if 'shared' is True),
+        or parses a text map (streaming its rows, see 'parse()').
+        '''
+        if CompiledMap.is_compiled(mapfile):
+            return CompiledMap.load(mapfile, shared)
+        return cls.parse(mapfile, lazy=True)
+
+    @classmethod
+    def parse(cls, mapfile, lazy=False):
         '''
         Reads a map file by first parsing all key value pairs
         and then parsing the dungeon.
@@ -425,6 +926,9 @@ class Dungeon:
         Do not leave empty lines.
         Every 'key=value' pair must be on a new line.
         The dungeon matrix must have each row on a new line.
+
+        The dungeon is returned as a TileGrid. If 'lazy' is True, its rows are streamed
+        from the file (in chunks) only when they are first accessed.
         '''
         data = dict()
         with open(mapfile, 'r') as f:
@@ -435,8 +939,7 @@ class Dungeon:
             if len(data) != cls.parser_index_size:
                 raise ValueError("Parser met duplicating keywords.")
 
-            dungeon = f.readlines()
-            data['dungeon'] = cls.parse_dungeon(dungeon)
+        data['dungeon'] = cls.parse_dungeon(mapfile, data['dimensions'], lazy)
         return data
 
     @classmethod
@@ -480,15 +983,13 @@ class Dungeon:
         return (player_row, player_col)
 
     @classmethod
-    def parse_dungeon(cls, matrix):
-        for idx, line in enumerate(matrix):
-            if line == "":
-                del matrix[idx]
-            else:
-                matrix[idx] = list(line.strip())
-                if matrix[idx][-1] == '\n':
-                    matrix[idx] = matrix[idx][:-1]
-        return matrix
+    def parse_dungeon(cls, mapfile, dimensions, lazy=False):
+        rows, cols = dimensions
+        lines = TileGrid.read_lines(mapfile, skip=cls.parser_index_size)
+        grid = TileGrid(rows, cols, lines, chunk_rows=cls.chunk_rows)
+        if not lazy:
+            grid.load_all()
+        return grid
 
 
 
@@ -509,4 +1010,14 @@ class Dungeon:
         which enables rendering of the map collisions.
         '''
 
-        self.show_entity_collision = val
\ No newline at end of file
+        self.show_entity_collision = val
+
+    def enable_dirty_rendering(self, val=True):
+        '''
+        Sets the 'dirty_rendering' variable to True (by default) or False.\n
+        When enabled, 'render()' only redraws the regions that changed since the last frame
+        and 'update_display()' pushes only those regions to the display.
+        '''
+
+        self.dirty_rendering = val
+        self.request_full_redraw()
\ No newline at end of file
@@ -0,0 +1,187 @@
+import random
+from collections import deque
+
+
+class MapGenerator:
+    '''
+    Generates random maps in the format read by 'Dungeon.parse()'.\n
+    A maze of corridors is carved out of solid blocks first, so every floor tile is reachable from the player.
+    Blocks are only ever removed after that, which can add loops but never disconnect anything.\n
+
+    'connectivity' controls how many of the walls between two corridors are knocked out
+    (0 keeps a perfect maze with a single path between any two tiles, 1 opens every one of them),
+    'block_density' is the highest fraction of the inside of the map allowed to stay solid.
+    Enemies, potions and ammo are scattered over the floor with the given densities (fractions of the floor tiles),
+    and the gates are put on the floor tiles farthest away from the player.\n
+
+    The player always starts in the top left corner (1, 1).
+    '''
+
+    PLAYER_START = (1, 1)
+
+    def __init__(self, rows, cols, seed=None, color=(40, 38, 45), connectivity=0.1, block_density=0.5,
+                 enemies=0.02, potions=0.01, ammo=0.01, gates=1):
+        '''
+        Parameters:\n
+        rows, cols - size of the map in tiles (at least 3x3, up to 1000x1000)\n
+        seed - seed of the random generator (the same seed always generates the same map)\n
+        color - background color of the map\n
+        connectivity - fraction of the walls between corridors to knock out (0 to 1)\n
+        block_density - the highest fraction of the inside of the map that stays solid (0 to 1)\n
+        enemies, potions, ammo - fraction of the floor tiles to place each entity on\n
+        gates - the number of gates
+        '''
+        if not (3 <= rows <= 1000 and 3 <= cols <= 1000):
+            raise ValueError("Map dimensions must be between 3x3 and 1000x1000.")
+        if not (0 <= connectivity <= 1 and 0 <= block_density <= 1):
+            raise ValueError("connectivity and block_density must be between 0 and 1.")
+
+        self.rows = rows
+        self.cols = cols
+        self.seed = seed
+        self.color = color
+        self.connectivity = connectivity
+        self.block_density = block_density
+        self.densities = [('E', enemies), ('P', potions), ('A', ammo)]
+        self.gates = gates
+
+
+
+
+    # $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$ Generation $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$
+
+    def generate(self):
+        '''
+        Returns the map as a list of rows, each one a string of tile characters.\n
+        Raises ValueError if there are fewer reachable floor tiles (other than the player's) than gates
+        (e.g. 3x3, 3x4 and 4x3 maps only have room for the player).
+        '''
+        rng = random.Random(self.seed)
+        grid = [bytearray(b'B' * self.cols) for r in range(self.rows)]
+
+        self.carve_maze(grid, rng)
+        self.open_walls(grid, rng)
+        self.thin_blocks(grid, rng)
+        self.place_entities(grid, rng)
+
+        return [row.decode('ascii') for row in grid]
+
+    def carve_maze(self, grid, rng):
+        '''
+        Carves corridors between the tiles with odd coordinates (an iterative depth first search),
+        starting from the player.
+        '''
+        start = MapGenerator.PLAYER_START
+        grid[start[0]][start[1]] = ord(' ')
+        stack = [start]
+        while stack:
+            r, c = stack[-1]
+            neighbours = [(r + dr, c + dc, r + dr // 2, c + dc // 2) for dr, dc in ((-2, 0), (2, 0), (0, -2), (0, 2))
+                          if 0 < r + dr < self.rows - 1 and 0 < c + dc < self.cols - 1 and grid[r + dr][c + dc] == ord('B')]
+            if not neighbours:
+                stack.pop()
+                continue
+            nr, nc, wr, wc = rng.choice(neighbours)
+            grid[wr][wc] = ord(' ')
+            grid[nr][nc] = ord(' ')
+            stack.append((nr, nc))
+
+    def open_walls(self, grid, rng):
+        '''
+        Knocks out a 'connectivity' fraction of the walls that separate two corridors (adding loops).
+        '''
+        if self.connectivity == 0:
+            return
+        for r in range(1, self.rows - 1):
+            for c in range(1, self.cols - 1):
+                if grid[r][c] != ord('B') or (r % 2 == 0) == (c % 2 == 0):
+                    continue  # Only the tiles between two odd tiles are walls of the maze
+                if r % 2 == 0:
+                    between = grid[r - 1][c] == ord(' ') and r + 1 < self.rows - 1 and grid[r + 1][c] == ord(' ')
+                else:
+                    between = grid[r][c - 1] == ord(' ') and c + 1 < self.cols - 1 and grid[r][c + 1] == ord(' ')
+                if between and rng.random() < self.connectivity:
+                    grid[r][c] = ord(' ')
+
+    def thin_blocks(self, grid, rng):
+        '''
+        Removes random blocks from the inside of the map until at most 'block_density' of it is solid.\n
+        Only blocks next to the floor are removed, so the new floor is connected as well.
+        '''
+        inside = (self.rows - 2) * (self.cols - 2)
+        blocks = [(r, c) for r in range(1, self.rows - 1) for c in range(1, self.cols - 1) if grid[r][c] == ord('B')]
+        excess = len(blocks) - int(inside * self.block_density)
+        rng.shuffle(blocks)
+
+        while excess > 0 and blocks:
+            skipped = []
+            for r, c in blocks:
+                if excess <= 0:
+                    break
+                if any(grid[nr][nc] == ord(' ') for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1))):
+                    grid[r][c] = ord(' ')
+                    excess -= 1
+                else:
+                    skipped.append((r, c))
+            if len(skipped) == len(blocks):
+                break
+            blocks = skipped
+
+    def place_entities(self, grid, rng):
+        '''
+        Puts the gates on the floor tiles farthest from the player and scatters the rest of the entities over the floor.
+        '''
+        distances = self.floor_distances(grid)
+        start = MapGenerator.PLAYER_START
+
+        # The player's spawn is never a gate (the map would be won on the first tick)
+        farthest = sorted((pos for pos in distances if pos != start), key=distances.get, reverse=True)
+        if len(farthest) < self.gates:
+            raise ValueError(f"A {self.rows}x{self.cols} map doesn't have room for {self.gates} gate(s) away from the player.")
+        for r, c in farthest[:self.gates]:
+            grid[r][c] = ord('G')
+
+        floor = [pos for pos in distances if pos != start and grid[pos[0]][pos[1]] == ord(' ')]
+        rng.shuffle(floor)
+        taken = 0
+        for tile, density in self.densities:
+            count = min(int(len(distances) * density), len(floor) - taken)
+            for r, c in floor[taken:taken + count]:
+                grid[r][c] = ord(tile)
+            taken += count
+
+    def floor_distances(self, grid):
+        '''
+        Returns a dict of (row, col) -> distance from the player (in tiles) for every reachable floor tile.
+        '''
+        start = MapGenerator.PLAYER_START
+        distances = {start: 0}
+        queue = deque([start])
+        while queue:
+            r, c = queue.popleft()
+            for pos in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                if pos not in distances and grid[pos[0]][pos[1]] != ord('B'):
+                    distances[pos] = distances[(r, c)] + 1
+                    queue.append(pos)
+        return distances
+
+
+
+
+    # $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$ Output $$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$
+
+    def to_text(self):
+        '''
+        Returns the whole map file (key=value pairs followed by the dungeon matrix).
+        '''
+        r, g, b = self.color
+        header = [
+            f"dimensions={self.rows}x{self.cols}",
+            f"color={r}, {g}, {b}",
+            f"player={MapGenerator.PLAYER_START[1]}, {MapGenerator.PLAYER_START[0]}"  # The player is stored as column, row
+        ]
+        return '\n'.join(header + self.generate()) + '\n'
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            f.write(self.to_text())
@@ -0,0 +1,118 @@
+import pygame
+from collections import OrderedDict
+
+
+class StaticLayer:
+    '''
+    Off-screen cache for the parts of the map that never change
+    (background color, blocks and gates).\n
+    Add every static layer with add_tiles(), then call render() every frame.\n
+    The tiles of a layer are composited with a single Surface.blits() call per chunk.\n
+    The layer is split into chunks of 'chunk_size' pixels, each composited into its own Surface
+    the first time a part of it is rendered (or when build() is called) and reused until invalidate() is called,
+    so only the chunks around the visible part of a big map are ever composited.
+    At most 'max_chunks' are kept, the least recently rendered ones are dropped first.\n
+    '''
+
+    def __init__(self, size, color, chunk_size=(512, 512), max_chunks=64):
+        '''
+        Parameters:\n
+        size - (width, height) of the area the layer covers (in pixels)\n
+        color - background color to fill the layer with\n
+        chunk_size - (width, height) of a single chunk\n
+        max_chunks - the number of composited chunks to hold on to
+        '''
+        self.size = size
+        self.color = color
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.layers = []  # List of (image, area, tiles), composited in the order they were added
+        self.chunks = OrderedDict()  # (col, row) -> Surface, ordered from least to most recently rendered
+
+    def add_tiles(self, image, tiles, area=None):
+        '''
+        Registers a static layer.\n
+        image - the Surface to draw for every tile\n
+        area - the part of the image to draw (e.g. a tile of a TileAtlas), the whole image by default\n
+        tiles - sequence of (x, y, ...) tuples (only the position is used),
+        or a function taking a rect and returning an iterable of the tiles that overlap it
+        (called every time a chunk is composited)
+        '''
+        self.layers.append((image, pygame.Rect(area) if area is not None else image.get_rect(), tiles))
+        self.invalidate()
+
+    def clear(self):
+        self.layers = []
+        self.invalidate()
+
+    def invalidate(self, rect=None):
+        '''
+        Drops the composited chunks overlapping the rect (or all of them, if no rect is passed).
+        They will be composited again the next time they are rendered.
+        '''
+        if rect is None:
+            self.chunks = OrderedDict()
+            return
+        for key in self.chunk_keys(rect):
+            self.chunks.pop(key, None)
+
+    def is_valid(self):
+        return len(self.chunks) > 0
+
+    def chunk_keys(self, rect):
+        '''
+        Returns the (col, row) of every chunk the rect overlaps (clipped to the layer).
+        '''
+        rect = pygame.Rect(rect).clip(pygame.Rect((0, 0), self.size))
+        if rect.width == 0 or rect.height == 0:
+            return []
+        cw, ch = self.chunk_size
+        return [(col, row)
+                for row in range(rect.top // ch, (rect.bottom - 1) // ch + 1)
+                for col in range(rect.left // cw, (rect.right - 1) // cw + 1)]
+
+    def chunk_rect(self, key):
+        cw, ch = self.chunk_size
+        return pygame.Rect(key[0] * cw, key[1] * ch, cw, ch).clip(pygame.Rect((0, 0), self.size))
+
+    def chunk(self, key):
+        '''
+        Returns the composited Surface of the chunk, compositing it first if needed.
+        '''
+        surface = self.chunks.get(key)
+        if surface is not None:
+            self.chunks.move_to_end(key)
+            return surface
+
+        rect = self.chunk_rect(key)
+        surface = pygame.Surface(rect.size)
+        surface.fill(self.color)
+        for image, area, tiles in self.layers:
+            if callable(tiles):
+                tiles = tiles(rect)
+            w, h = area.size
+            surface.blits([(image, (tile[0] - rect.x, tile[1] - rect.y), area) for tile in tiles
+                           if rect.colliderect((tile[0], tile[1], w, h))], doreturn=False)
+
+        self.chunks[key] = surface
+        while len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+        return surface
+
+    def build(self, area=None):
+        '''
+        Composites every chunk overlapping the area (the whole layer by default) ahead of rendering.
+        '''
+        for key in self.chunk_keys(area or pygame.Rect((0, 0), self.size)):
+            self.chunk(key)
+
+    def render(self, screen, dest=(0, 0), area=None):
+        '''
+        Blits the 'area' of the layer (the whole layer by default) to 'dest' on the screen.
+        '''
+        area = pygame.Rect(area) if area is not None else pygame.Rect((0, 0), self.size)
+        for key in self.chunk_keys(area):
+            surface = self.chunk(key)
+            rect = self.chunk_rect(key)
+            part = rect.clip(area)
+            screen.blit(surface, (dest[0] + part.x - area.x, dest[1] + part.y - area.y), part.move(-rect.x, -rect.y))
@@ -0,0 +1,49 @@
+import pygame
+
+
+class TileAtlas:
+    '''
+    All the tile images of the map packed side by side into a single Surface.\n
+    Every image is drawn as an area of the atlas, so all the tiles of a layer are drawn with one
+    Surface.blits() call (see render()) instead of one blit() call per tile.\n
+    Build a new atlas whenever the images change (e.g. after the display mode changes).
+    '''
+
+    def __init__(self, images):
+        '''
+        Parameters:\n
+        images - dict of name -> Surface to pack (e.g. tile type -> tile image)
+        '''
+        w = sum(image.get_width() for image in images.values())
+        h = max((image.get_height() for image in images.values()), default=0)
+        self.surface = pygame.Surface((max(w, 1), max(h, 1)), pygame.SRCALPHA)
+        self.surface.fill((0, 0, 0, 0))
+        self.areas = dict()  # name -> the Rect of the image in the atlas
+
+        x = 0
+        for name, image in images.items():
+            # MAX against the transparent atlas copies the pixels (alpha included) without blending them
+            self.surface.blit(image, (x, 0), special_flags=pygame.BLEND_RGBA_MAX)
+            self.areas[name] = pygame.Rect((x, 0), image.get_size())
+            x += image.get_width()
+
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert_alpha()
+
+    def area(self, name):
+        return self.areas[name]
+
+    def blit_sequence(self, name, tiles, offset=(0, 0)):
+        '''
+        Returns the (source, dest, area) sequence that draws the image at every tile
+        (a (x, y, ...) tuple, only the position is used) moved by -offset, for Surface.blits().
+        '''
+        surface, area = self.surface, self.areas[name]
+        offset_x, offset_y = offset
+        return [(surface, (tile[0] - offset_x, tile[1] - offset_y), area) for tile in tiles]
+
+    def render(self, screen, name, tiles, offset=(0, 0)):
+        '''
+        Draws the image at every tile with a single blits() call (see blit_sequence()).
+        '''
+        screen.blits(self.blit_sequence(name, tiles, offset), doreturn=False)
@@ -0,0 +1,195 @@
+try:
+    import numpy
+except ImportError:  # NumPy is optional, only position_arrays() needs it
+    numpy = None
+
+
+class TileGrid:
+    '''
+    Compact, row-major matrix of map tiles, one byte (the tile code) per tile.\n
+    The tile codes are the characters used in the map files (see the constants below).
+    Whole regions are searched with the bytearray's own find(), without touching every tile from Python.\n
+    Rows can be streamed in from a source of text lines (e.g. a map file) in chunks of 'chunk_rows':
+    they are only read when something asks for them (see ensure_loaded()), so a huge map
+    doesn't have to be read as a whole before the game starts.\n
+    Rows missing from the source and the end of rows shorter than 'cols' are empty (' ') tiles.\n
+
+    A grid can also be a read-only view of tile codes that are already in memory (see from_buffer()),
+    e.g. a memory-mapped compiled map shared between processes.
+    '''
+
+    # True if NumPy is installed (see position_arrays())
+    vectorized = numpy is not None
+
+    # =============== Tile Codes ===============
+    EMPTY = ord(' ')
+    BLOCK = ord('B')
+    ENEMY = ord('E')
+    POTION = ord('P')
+    AMMO = ord('A')
+    GATE = ord('G')
+
+    def __init__(self, rows, cols, source=None, chunk_rows=32, data=None):
+        '''
+        Parameters:\n
+        rows, cols - dimensions of the map (in tiles)\n
+        source - iterator of text lines (one row each) to load the rows from, or None for an empty grid\n
+        chunk_rows - how many rows are read from the source at once\n
+        data - existing tile codes to use instead of allocating them (see from_buffer())
+        '''
+        self.rows = rows
+        self.cols = cols
+        self.chunk_rows = chunk_rows
+        self.data = data if data is not None else bytearray(bytes([TileGrid.EMPTY]) * (rows * cols))
+        self.offset = 0  # Where the first tile is in 'data'
+
+        self.source = source
+        self.loaded_rows = 0 if source is not None else rows  # Rows [0, loaded_rows) are available
+
+    @classmethod
+    def from_bytes(cls, rows, cols, data):
+        '''
+        Creates a fully loaded grid from 'rows * cols' tile codes (row-major), e.g. from a compiled map.
+        '''
+        if len(data) != rows * cols:
+            raise ValueError(f"Expected {rows * cols} tiles, got {len(data)}.")
+        grid = cls(rows, cols)
+        grid.data[:] = data
+        return grid
+
+    @classmethod
+    def from_buffer(cls, rows, cols, buffer, offset=0):
+        '''
+        Creates a read-only grid over 'rows * cols' tile codes (row-major) starting at 'offset' in the buffer,
+        without copying them.\n
+        The buffer must support slicing and find() (bytes, bytearray or mmap).
+        '''
+        if len(buffer) - offset < rows * cols:
+            raise ValueError(f"Expected {rows * cols} tiles, got {len(buffer) - offset}.")
+        grid = cls(rows, cols, data=buffer)
+        grid.offset = offset
+        return grid
+
+    @staticmethod
+    def read_lines(filename, skip=0):
+        '''
+        Generator of the lines of a text file (without the first 'skip' ones).\n
+        The file stays open only until the last line is read.
+        '''
+        with open(filename, 'r') as f:
+            for i in range(skip):
+                f.readline()
+            for line in f:
+                yield line
+
+    def load_chunk(self):
+        '''
+        Reads the next 'chunk_rows' rows from the source.
+        '''
+        end = min(self.loaded_rows + self.chunk_rows, self.rows)
+        while self.loaded_rows < end:
+            line = next(self.source, None)
+            if line is None:
+                self.loaded_rows = self.rows  # The source ran out, the remaining rows stay empty
+                break
+            line = line.rstrip('\r\n')
+            if line == "":
+                continue
+            self.set_row(self.loaded_rows, line)
+            self.loaded_rows += 1
+
+        if self.loaded_rows == self.rows:
+            self.source = None
+
+    def ensure_loaded(self, row):
+        '''
+        Makes sure every row up to (and including) 'row' is read from the source.
+        '''
+        while self.loaded_rows <= row and self.source is not None:
+            self.load_chunk()
+
+    def load_all(self):
+        self.ensure_loaded(self.rows - 1)
+        return self
+
+    def is_loaded(self):
+        return self.source is None
+
+    def set_row(self, row, line):
+        start = self.offset + row * self.cols
+        raw = line[:self.cols].encode('ascii')
+        self.data[start:start + len(raw)] = raw
+
+    def row(self, row):
+        '''
+        Returns the row as a string of tile characters.
+        '''
+        self.ensure_loaded(row)
+        start = self.offset + row * self.cols
+        return bytes(self.data[start:start + self.cols]).decode('ascii')
+
+    def tile(self, row, col):
+        '''
+        Returns the tile code at the position.
+        '''
+        self.ensure_loaded(row)
+        return self.data[self.offset + row * self.cols + col]
+
+    def contains(self, code, first_row, last_row, first_col, last_col):
+        '''
+        Returns True if any tile in the (inclusive) range of rows and columns has the tile code.
+        '''
+        self.ensure_loaded(last_row)
+        needle = bytes((code,))
+        for row in range(first_row, last_row + 1):
+            start = self.offset + row * self.cols
+            if self.data.find(needle, start + first_col, start + last_col + 1) != -1:
+                return True
+        return False
+
+    def positions(self, code, first_row=0, last_row=None, first_col=0, last_col=None):
+        '''
+        Generator of the (row, col) of every tile with the tile code in the (inclusive) range of rows
+        and columns, in row-major order.
+        '''
+        last_row = self.rows - 1 if last_row is None else last_row
+        last_col = self.cols - 1 if last_col is None else last_col
+        self.ensure_loaded(last_row)
+        needle = bytes((code,))
+
+        if first_col == 0 and last_col == self.cols - 1:
+            # Whole rows are contiguous, so the range can be searched in one go
+            spans = [(first_row, last_row)]
+        else:
+            spans = [(row, row) for row in range(first_row, last_row + 1)]
+
+        for span_first, span_last in spans:
+            start = self.offset + span_first * self.cols + first_col
+            end = self.offset + span_last * self.cols + last_col + 1
+            idx = self.data.find(needle, start, end)
+            while idx != -1:
+                yield divmod(idx - self.offset, self.cols)
+                idx = self.data.find(needle, idx + 1, end)
+
+    def position_arrays(self, code, first_row=0, last_row=None):
+        '''
+        Returns the rows and the columns (two NumPy arrays) of every tile with the tile code
+        in the (inclusive) range of rows, in row-major order - found in a single vectorized pass.\n
+        Requires NumPy (see 'TileGrid.vectorized').
+        '''
+        last_row = self.rows - 1 if last_row is None else last_row
+        self.ensure_loaded(last_row)
+        band = numpy.frombuffer(self.data, dtype=numpy.uint8, count=(last_row - first_row + 1) * self.cols,
+                                offset=self.offset + first_row * self.cols)
+        rows, cols = numpy.divmod(numpy.flatnonzero(band == code), self.cols)
+        return rows + first_row, cols
+
+    def count(self, code):
+        return sum(1 for position in self.positions(code))
+
+    def __len__(self):
+        return self.rows
+
+    def __iter__(self):
+        for i in range(self.rows):
+            yield self.row(i)
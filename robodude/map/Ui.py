@@ -1,6 +1,9 @@
 import pygame
 
 
+from ..utils.TextCache import TextCache
+
+
 class Ui:
     def __init__(self, w, h, player):
         self.player = player
@@ -12,30 +15,61 @@ class Ui:
         self.box = (0, 0, self.w, self.h)
 
         self.font = pygame.font.Font('freesansbold.ttf', 18)
+        self.text_cache = TextCache(self.font)
+
+        # The top bar is composited once and reused until the values it displays change
+        self.surface = None
+        self.state = None
 
     def render(self, screen):
-        pygame.draw.rect(screen, self.color, self.box)
-        pygame.draw.rect(screen, self.border_color, self.box, 4)
+        if self.is_dirty():
+            self.compose()
+        screen.blit(self.surface, (0, 0))
+
+    def compose(self):
+        '''
+        Draws the whole top bar onto its own Surface.
+        '''
+        self.surface = pygame.Surface((self.w, self.h))
+        self.state = self.current_state()
+
+        pygame.draw.rect(self.surface, self.color, self.box)
+        pygame.draw.rect(self.surface, self.border_color, self.box, 4)
 
         flex = self.w // 3
         flex_offset = flex // 2
 
-        txt_health = self.font.render(f"Health: {self.player.healthpool} / {self.player.max_health}", True, (255, 255, 255), self.color)
+        txt_health = self.text_cache.render(f"Health: {self.player.healthpool} / {self.player.max_health}", (255, 255, 255), self.color)
         txt_health_rect = txt_health.get_rect()
         txt_health_rect.center = (flex * 1 - flex_offset , self.h // 2)
 
-        txt_ammo = self.font.render(f"Ammo: {self.player.ammo} / {self.player.max_ammo}", True, (255, 255, 255), self.color)
+        txt_ammo = self.text_cache.render(f"Ammo: {self.player.ammo} / {self.player.max_ammo}", (255, 255, 255), self.color)
         txt_ammo_rect = txt_ammo.get_rect()
         txt_ammo_rect.center = (flex * 2 - flex_offset, self.h // 2)
 
-        txt_critical_meter = self.font.render(f"Critical meter: {self.player.critical_meter} / {self.player.critical_meter_max}", True, (255, 255, 255), self.color)
+        txt_critical_meter = self.text_cache.render(f"Critical meter: {self.player.critical_meter} / {self.player.critical_meter_max}", (255, 255, 255), self.color)
         txt_critical_meter_rect = txt_critical_meter.get_rect()
         txt_critical_meter_rect.center = (flex * 3 - flex_offset, self.h // 2)
 
-        screen.blit(txt_health, txt_health_rect)
-        screen.blit(txt_ammo, txt_ammo_rect)
-        screen.blit(txt_critical_meter, txt_critical_meter_rect)
+        self.surface.blit(txt_health, txt_health_rect)
+        self.surface.blit(txt_ammo, txt_ammo_rect)
+        self.surface.blit(txt_critical_meter, txt_critical_meter_rect)
+
+    def current_state(self):
+        '''
+        Returns the player values displayed in the top bar.
+        '''
+        return (self.player.healthpool, self.player.max_health,
+                self.player.ammo, self.player.max_ammo,
+                self.player.critical_meter, self.player.critical_meter_max)
+
+    def is_dirty(self):
+        '''
+        Returns True if the top bar has to be composited again before it is rendered.
+        '''
+        return self.surface is None or self.state != self.current_state()
 
     def update_width(self, w):
         self.w = w
-        self.box = (0, 0, self.w, self.h)
\ No newline at end of file
+        self.box = (0, 0, self.w, self.h)
+        self.surface = None
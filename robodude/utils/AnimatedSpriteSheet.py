@@ -2,6 +2,24 @@ import pygame
 
 
 from ..utils import utils
+from .AssetCache import AssetCache
+
+
+class AnimationClock:
+    '''
+    The time (in milliseconds) every AnimatedSpriteSheet resolves its current frame from.\n
+    The time is latched once per game frame by update(), so every sheet rendered during
+    the same frame agrees on it. 'source' can be replaced with any function returning milliseconds
+    (e.g. to drive animations from a simulated clock).
+    '''
+
+    def __init__(self, source=pygame.time.get_ticks):
+        self.source = source
+        self.now = 0
+
+    def update(self):
+        self.now = self.source()
+        return self.now
 
 
 class AnimatedSpriteSheet:
@@ -13,27 +31,125 @@ class AnimatedSpriteSheet:
     If one of the 2 dimensional parameters (w or h) is set to -1,\n
     the other will be auto-calculated to be proportional to the first.\n
 
-    Call the animation_update() method to move the animations along.\n
+    Call AnimatedSpriteSheet.clock.update() once per game frame to move the animations along.\n
     Call the render() method to render the appropriate frame automatically.\n
+    The current frame is computed from the shared clock only when it is rendered,
+    so sheets that are not on screen cost nothing.\n
+
+    The scaled sheet is shared through the AssetCache, so every instance
+    created with the same parameters only keeps its own animation counters.\n
+
+    Frames are cut out of the sheet along integer rects, row by row (frame 'index' is in row index // cols).
+    By default ('presliced') every frame is copied into its own Surface when the sheet is loaded
+    (shared through the AssetCache as well), so rendering a frame is a plain blit of a whole Surface
+    instead of a blit of an area of the sheet that SDL has to clip every time.
+    The sheet itself is then dropped from the AssetCache, so its pixels are only held once (by the frames).\n
     '''
 
-    def __init__(self, filename, rows, cols, w, h, animation_speed=10, game_fps=60):
+    # Shared by every sheet (see AnimationClock)
+    clock = AnimationClock()
+
+    # Sheet key -> Rect of the whole sheet, for the sheets whose frames were sliced (and the sheet dropped)
+    sliced_sheets = dict()
+
+    def __init__(self, filename, rows, cols, w, h, animation_speed=10, game_fps=60, presliced=True):
         '''
         Parameters:\n
         filename - spritesheet image path\n
         rows, cols - gives information on how to cut up the matrix (spritesheet)
         w, h - desired sizes for each frame
         animation_fps - what fps does the animation consist of
-        game_fps - (default 60), what fps the game the spritesheet will be rendered in use
+        game_fps - (default 60), what fps the game the spritesheet will be rendered in use\n
+        presliced - (default True), if every frame should be copied into its own Surface (see above)
         '''
 
         # =============== Frame Data ===============
-        original = pygame.image.load(filename)
-        sz = original.get_size()
         self.rows = rows
         self.cols = cols
         self.frame_count = rows * cols
 
+        self.sheet_key = ('sheet', filename, rows, cols, w, h)
+        self.sheet_loader = lambda: AnimatedSpriteSheet.load_sheet(filename, rows, cols, w, h)
+        self.presliced = presliced
+        # Once sliced, the frames are all that is needed (see slice_frames())
+        rect = AnimatedSpriteSheet.sliced_sheets.get(self.sheet_key) if presliced else None
+        self.sheet = AssetCache.shared().get(self.sheet_key, self.sheet_loader) if rect is None else None
+        AssetCache.shared().subscribe(self.reload_sheet)
+
+        self.rect = rect if rect is not None else self.sheet.get_rect()
+        self.frame_width = self.rect.width // cols
+        self.frame_height = self.rect.height // rows
+
+        # The area of every frame in the sheet (if the sheet doesn't divide evenly, the frames start where a fractional split would)
+        self.frames = [pygame.Rect(index % cols * self.rect.width // cols, index // cols * self.rect.height // rows,
+                                   self.frame_width, self.frame_height)
+                       for index in range(self.frame_count)]
+        self.frame_surfaces = None
+        if presliced:
+            self.frame_surfaces = self.slice_frames()
+            self.sheet = None
+
+        # =============== Animation ===============
+        self.anim_speed = animation_speed
+        self.game_fps = game_fps
+        self.loops = self.game_fps // self.anim_speed  # How many game frames a single animation frame lasts
+        self.frame_duration = self.loops * 1000 / self.game_fps  # The same, in milliseconds
+        self.anim_start = AnimatedSpriteSheet.clock.now  # When the animation (or the current one-shot loop) started
+
+    def reload_sheet(self):
+        '''
+        Fetches the sheet (or the presliced frames) from the AssetCache again (called when the display mode changes,
+        so they are in the new display pixel format).
+        '''
+        if self.presliced:
+            self.frame_surfaces = self.slice_frames()
+        else:
+            self.sheet = AssetCache.shared().get(self.sheet_key, self.sheet_loader)
+
+    def slice_frames(self):
+        '''
+        Returns a Surface for every frame, fetched from the AssetCache or copied out of the sheet.\n
+        The sheet is only loaded if a frame isn't cached, and is dropped from the AssetCache afterwards.
+        '''
+        assets = AssetCache.shared()
+        sheet = self.sheet
+
+        def cut(rect):
+            nonlocal sheet
+            if sheet is None:
+                sheet = assets.get(self.sheet_key, self.sheet_loader)
+            return sheet.subsurface(rect).copy()
+
+        frames = [assets.get(self.sheet_key + (index,), lambda rect=rect: cut(rect))
+                  for index, rect in enumerate(self.frames)]
+        assets.discard(self.sheet_key)
+        AnimatedSpriteSheet.sliced_sheets[self.sheet_key] = self.rect
+        for frame in frames:
+            # RLE encoded frames skip their transparent pixels when blitted (the copies lose the sheet's flag)
+            if frame.get_flags() & pygame.SRCALPHA and not frame.get_flags() & pygame.RLEACCELOK:
+                frame.set_alpha(255, pygame.RLEACCEL)
+        return frames
+
+    @staticmethod
+    def prefetch(filename, rows, cols, w, h):
+        '''
+        Starts loading and scaling the spritesheet on a worker thread, so that
+        constructing an AnimatedSpriteSheet with the same parameters later doesn't have to wait for it.
+        Sheets that were already sliced into frames are not loaded again.
+        '''
+        if ('sheet', filename, rows, cols, w, h) in AnimatedSpriteSheet.sliced_sheets:
+            return
+        AssetCache.shared().prefetch(('sheet', filename, rows, cols, w, h),
+                                     lambda: AnimatedSpriteSheet.load_sheet(filename, rows, cols, w, h))
+
+    @staticmethod
+    def load_sheet(filename, rows, cols, w, h):
+        '''
+        Loads the spritesheet image and scales it so every frame is (w, h) (see the constructor).
+        '''
+        original = pygame.image.load(filename)
+        sz = original.get_size()
+
         if w == -1 and h > 0:
             h *= rows
             w = utils.get_proportional(sz, h, width=False)  # We are passing Height not Width (and expecting a proportionate width value)
@@ -46,39 +162,58 @@ class AnimatedSpriteSheet:
             w *= cols
             h *= rows
 
-        self.sheet = pygame.transform.scale(original, (w, h))
+        return pygame.transform.scale(original, (w, h))
 
-        self.rect = self.sheet.get_rect()
-        self.frame_width = self.rect.width / cols
-        self.frame_height = self.rect.height / rows
-
-        self.frames = list([(index % cols * self.frame_width, index % rows * self.frame_height, self.frame_width, self.frame_height)
-                            for index in range(self.frame_count)])
+    @property
+    def anim_elapsed_frames(self):
+        '''
+        The number of animation frames shown since the animation started (according to the shared clock).
+        '''
+        return max(0, int((AnimatedSpriteSheet.clock.now - self.anim_start) // self.frame_duration))
 
-        # =============== Animation ===============
-        self.anim_speed = animation_speed
-        self.anim_current_frame = 0
-        self.anim_count = 0
-        self.game_fps = game_fps
-        self.loops = self.game_fps // self.anim_speed
+    @property
+    def anim_current_frame(self):
+        return self.anim_elapsed_frames % self.frame_count
 
+    def frame(self, index):
+        '''
+        Returns the (Surface, area) to blit to draw the frame (the area is None for presliced frames).
+        '''
+        if self.frame_surfaces is not None:
+            return self.frame_surfaces[index], None
+        return self.sheet, self.frames[index]
 
     def render(self, screen, x, y):
-            screen.blit(self.sheet, (x, y), self.frames[self.anim_current_frame])
+            surface, area = self.frame(self.anim_current_frame)
+            screen.blit(surface, (x, y), area)
 
-    def animation_update(self):
-        if self.anim_count == self.frame_count * self.loops:
-            self.anim_count = 0
+    def render_many(self, screen, positions, phases=None):
+        '''
+        Renders the animation at every (x, y) position with a single blits() call
+        (e.g. every enemy on screen, all sharing this sheet).\n
+        phases - optional sequence (the same length as 'positions') of how many frames
+        each copy of the animation is ahead of the others, so they don't all move in lockstep
+        '''
+        elapsed = self.anim_elapsed_frames
+        if phases is None:
+            surface, area = self.frame(elapsed % self.frame_count)
+            screen.blits([(surface, position, area) for position in positions], doreturn=False)
+            return
 
-        self.anim_current_frame = self.anim_count // self.loops
-        self.anim_count += 1
+        count = self.frame_count
+        frames = [self.frame((elapsed + phase) % count) for phase in range(count)]  # Frame shown with each phase
+        screen.blits([(frames[phase % count][0], position, frames[phase % count][1])
+                      for position, phase in zip(positions, phases)], doreturn=False)
 
     def setup_animate_once_loop(self):
-        self.anim_count = 0
-        self.anim_current_frame = 0
+        self.anim_start = AnimatedSpriteSheet.clock.now
 
     def animate_once_loop(self, screen, x, y):
-        self.render(screen, x, y)
-        if self.anim_count == self.frame_count * self.loops:
-            return True
-        return False
+        '''
+        Renders the next frame of a single run through the animation (started by 'setup_animate_once_loop()').\n
+        Returns True once the last frame has been shown for its whole duration.
+        '''
+        elapsed = self.anim_elapsed_frames
+        surface, area = self.frame(min(elapsed, self.frame_count - 1))
+        screen.blit(surface, (x, y), area)
+        return elapsed >= self.frame_count
@@ -0,0 +1,61 @@
+class AnimationTask:
+    '''
+    A one-shot animation played by the AnimationScheduler.
+    '''
+
+    def __init__(self, sheet, x, y, repeats, on_done):
+        self.sheet = sheet
+        self.x = x
+        self.y = y
+        self.repeats = repeats  # How many more times the animation has to play after the current run
+        self.on_done = on_done
+
+
+class AnimationScheduler:
+    '''
+    Plays one-shot AnimatedSpriteSheet sequences without blocking.\n
+    Queue an animation with play() and call render() once per frame from the main loop
+    (after AnimatedSpriteSheet.clock.update() has latched the frame's time). When an animation finishes,
+    its 'on_done' callback is called, which may queue the next animation.\n
+
+    This lets the caller keep its own frame limiting and event handling running while animations play.
+    '''
+
+    def __init__(self):
+        self.tasks = []
+
+    def play(self, sheet, x, y, repeats=1, on_done=None):
+        '''
+        Parameters:\n
+        sheet - the AnimatedSpriteSheet to play once from its first frame\n
+        x, y - where to render it\n
+        repeats - how many times to play it in a row\n
+        on_done - function (without arguments) called after the last run finishes
+        '''
+        sheet.setup_animate_once_loop()
+        self.tasks.append(AnimationTask(sheet, x, y, repeats - 1, on_done))
+
+    def is_busy(self):
+        return len(self.tasks) > 0
+
+    def render(self, screen):
+        '''
+        Renders the current frame of every playing animation and
+        finishes the ones that have reached their last frame.
+        '''
+        finished = []
+        for task in self.tasks:
+            if task.sheet.animate_once_loop(screen, task.x, task.y):
+                if task.repeats > 0:
+                    task.repeats -= 1
+                    task.sheet.setup_animate_once_loop()
+                else:
+                    finished.append(task)
+
+        for task in finished:
+            self.tasks.remove(task)
+            if task.on_done is not None:
+                task.on_done()
+
+    def clear(self):
+        self.tasks = []
@@ -0,0 +1,245 @@
+import pygame
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+from . import utils
+
+
+class AssetCache:
+    '''
+    Process-wide cache of loaded (and scaled) Surfaces.\n
+    Surfaces are handed out shared, so every object using the same asset
+    (e.g. every Battle_Ninja) blits from the same pixels and only keeps its own state.\n
+    Memory is bounded by an LRU limit (in bytes): when it is exceeded,
+    the least recently used assets are dropped from the cache.\n
+
+    Assets can be prefetched with prefetch(): they are loaded on a worker thread
+    and get() waits for the pending load instead of starting a new one.\n
+
+    Once a display exists, get() hands out Surfaces converted to the display pixel format
+    (so blitting them doesn't require a per-pixel conversion). Change the display mode through
+    set_display_mode(), so cached assets are re-converted and the objects holding them
+    (registered with subscribe()) can fetch the new Surfaces.\n
+
+    Use AssetCache.shared() to get the instance used by the game.
+    '''
+
+    _shared = None
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, workers=2):
+        '''
+        Parameters:\n
+        max_bytes - the maximum amount of pixel data (in bytes) the cache holds on to\n
+        workers - the number of threads used to prefetch assets
+        '''
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.entries = OrderedDict()  # key -> Surface, ordered from least to most recently used
+        self.pending = dict()  # key -> Future of an asset that is being prefetched
+
+        self.workers = workers
+        self.executor = None  # Created the first time something is prefetched
+        self.lock = threading.RLock()
+
+        # =============== Display Format ===============
+        self.generation = 0  # Incremented every time the display mode changes
+        self.formats = dict()  # key -> the generation the stored Surface was converted in
+        self.listeners = []  # Weak references to the methods called when the display mode changes
+
+    @classmethod
+    def shared(cls):
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    def set_limit(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.evict()
+
+    def get(self, key, loader):
+        '''
+        Returns the Surface stored under 'key'.\n
+        If it is being prefetched, waits for it to finish loading.
+        If there is none, calls 'loader' (without arguments) and stores the Surface it returns.
+        '''
+        with self.lock:
+            surface = self.entries.get(key)
+            if surface is not None:
+                self.entries.move_to_end(key)
+                return self.display_format(key, surface)
+            future = self.pending.get(key)
+
+        if future is not None:
+            surface = future.result()  # Re-raises if loading failed on the worker thread
+        else:
+            surface = loader()
+
+        with self.lock:
+            self.store(key, surface)
+            return self.display_format(key, self.entries.get(key, surface))
+
+    def display_format(self, key, surface):
+        '''
+        Converts the stored Surface to the current display pixel format (if it wasn't already)
+        and returns it (the lock must be held).\n
+        Must be called from the thread that owns the display.
+        '''
+        if self.formats.get(key) == self.generation or pygame.display.get_surface() is None:
+            return surface
+
+        # Colorkeyed images are converted to per-pixel alpha as well, SDL blits those faster
+        if surface.get_flags() & pygame.SRCALPHA or surface.get_colorkey() is not None:
+            surface = surface.convert_alpha()
+        else:
+            surface = surface.convert()
+
+        if key in self.entries:
+            self.size_bytes += AssetCache.surface_bytes(surface) - AssetCache.surface_bytes(self.entries[key])
+            self.entries[key] = surface
+            self.formats[key] = self.generation
+        return surface
+
+    def set_display_mode(self, size, flags=0, depth=32):
+        '''
+        Calls pygame.display.set_mode() and, if the display pixel format changed, runs the display format stage again:
+        the cached Surfaces are re-converted the next time they are requested,
+        and every subscribed listener is notified so it can request them.
+        Only resizing the display keeps the converted Surfaces as they are.
+
+        Returns:
+        Surface: the display Surface
+        '''
+        previous = AssetCache.pixel_format(pygame.display.get_surface())
+        screen = pygame.display.set_mode(size, flags, depth)
+        if AssetCache.pixel_format(screen) == previous:
+            return screen
+
+        with self.lock:
+            self.generation += 1
+            self.prune_listeners()
+            listeners = [ref() for ref in self.listeners]
+
+        for listener in listeners:
+            if listener is not None:  # Its object may have been collected since the list was copied
+                listener()
+        return screen
+
+    def subscribe(self, method):
+        '''
+        Registers a bound method to be called (without arguments) after the display mode changes.\n
+        Only a weak reference is kept, so subscribing doesn't keep the object alive.
+        '''
+        with self.lock:
+            self.prune_listeners()
+            self.listeners.append(weakref.WeakMethod(method))
+
+    def prune_listeners(self):
+        '''
+        Drops the listeners whose objects no longer exist (the lock must be held).
+        '''
+        self.listeners = [ref for ref in self.listeners if ref() is not None]
+
+    def prefetch(self, key, loader):
+        '''
+        Starts loading the asset on a worker thread (unless it is already cached or pending)
+        and returns immediately.\n
+        The result is picked up by the first get() with the same key.
+        '''
+        with self.lock:
+            if key in self.entries or key in self.pending:
+                return
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='asset-preload')
+            future = self.executor.submit(loader)
+            self.pending[key] = future
+
+        future.add_done_callback(lambda f: self.on_prefetched(key, f))
+
+    def on_prefetched(self, key, future):
+        with self.lock:
+            self.pending.pop(key, None)
+            if future.exception() is None:
+                self.store(key, future.result())
+
+    def store(self, key, surface):
+        '''
+        Adds the Surface to the cache (the lock must be held).
+        '''
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return
+        self.entries[key] = surface
+        self.size_bytes += AssetCache.surface_bytes(surface)
+        self.evict()
+
+    def image(self, filename, w, h, smooth=True):
+        '''
+        Returns the image scaled to (w, h).\n
+        If one of the dimensions is -1, it is calculated to be proportional to the other.
+        '''
+        return self.get(('image', filename, w, h, smooth), lambda: AssetCache.load_image(filename, w, h, smooth))
+
+    def prefetch_image(self, filename, w, h, smooth=True):
+        '''
+        Same as image(), but loads the image on a worker thread and returns immediately.
+        '''
+        self.prefetch(('image', filename, w, h, smooth), lambda: AssetCache.load_image(filename, w, h, smooth))
+
+    def evict(self):
+        '''
+        Drops the least recently used entries until the cache fits its limit
+        (the most recently used entry is always kept).
+        '''
+        while self.size_bytes > self.max_bytes and len(self.entries) > 1:
+            key, surface = self.entries.popitem(last=False)
+            self.formats.pop(key, None)
+            self.size_bytes -= AssetCache.surface_bytes(surface)
+
+    def discard(self, key):
+        '''
+        Drops the entry stored under 'key' (if any), e.g. once everything needed was derived from it.
+        '''
+        with self.lock:
+            surface = self.entries.pop(key, None)
+            self.formats.pop(key, None)
+            if surface is not None:
+                self.size_bytes -= AssetCache.surface_bytes(surface)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.formats.clear()
+            self.size_bytes = 0
+
+    @staticmethod
+    def pixel_format(surface):
+        '''
+        Returns the (bits per pixel, masks) of the Surface, or None if there is no Surface.
+        '''
+        if surface is None:
+            return None
+        return surface.get_bitsize(), surface.get_masks()
+
+    @staticmethod
+    def surface_bytes(surface):
+        return surface.get_pitch() * surface.get_height()
+
+    @staticmethod
+    def load_image(filename, w, h, smooth=True):
+        original = pygame.image.load(filename)
+        sz = original.get_size()
+
+        if w == -1 and h > 0:
+            w = utils.get_proportional(sz, h, width=False)
+        elif h == -1 and w > 0:
+            h = utils.get_proportional(sz, w, width=True)
+        elif w < 0 or h < 0:
+            raise ValueError("Either both dimensions are negative or one is less than -1.")
+
+        if smooth:
+            return pygame.transform.smoothscale(original, (w, h))
+        return pygame.transform.scale(original, (w, h))
@@ -0,0 +1,173 @@
+import pygame
+import random
+import struct
+import atexit
+import time
+
+
+from pygame.locals import *
+from .AnimatedSpriteSheet import AnimatedSpriteSheet
+
+
+class LiveInput:
+    '''
+    The source of input events for the game loops (Dungeon and Battle).\n
+    Every loop iteration the game calls get() for the events of the frame and tick() to end the frame.
+    Timers are set through set_timer() and pauses go through wait(), so that
+    InputRecorder and InputReplay can capture and reproduce them.\n
+
+    LiveInput simply reads pygame's event queue in real time.
+    '''
+
+    def __init__(self, fps=60):
+        self.fps = fps
+        self.frame = 0  # The number of frames ended by tick()
+
+    def get(self):
+        return pygame.event.get()
+
+    def tick(self, clock, fps):
+        self.frame += 1
+        clock.tick(fps)
+
+    def set_timer(self, event_type, ms):
+        pygame.time.set_timer(event_type, ms)
+
+    def wait(self, seconds):
+        time.sleep(seconds)
+
+    def now(self):
+        '''
+        Returns the game time (in milliseconds) derived from the frame count.
+        '''
+        return self.frame * 1000 // self.fps
+
+
+class InputRecorder(LiveInput):
+    '''
+    LiveInput that also writes every KEYDOWN / KEYUP event and every fired game timer
+    (pygame.USEREVENT and above) to a compact binary file, stamped with the frame
+    it happened in and the milliseconds since the recording started.\n
+
+    The 'random' module is seeded with the seed stored in the file, and animations
+    are driven by the frame count, so InputReplay can reproduce the session exactly.
+    '''
+
+    MAGIC = b'RDIN'
+    VERSION = 1
+    HEADER = struct.Struct('<4sBIH')  # magic, version, seed, fps
+    RECORD = struct.Struct('<IIBI')  # frame, milliseconds, kind, key or event type
+
+    KIND_KEYDOWN = 0
+    KIND_KEYUP = 1
+    KIND_TIMER = 2
+    KIND_END = 3  # Written when the recording is closed, marks the frame the session ended in
+
+    def __init__(self, filename, seed=None, fps=60):
+        LiveInput.__init__(self, fps)
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        random.seed(self.seed)
+        AnimatedSpriteSheet.clock.source = self.now
+
+        self.file = open(filename, 'wb')
+        self.file.write(InputRecorder.HEADER.pack(InputRecorder.MAGIC, InputRecorder.VERSION, self.seed, fps))
+        self.start = pygame.time.get_ticks()
+        self.ms = 0  # Milliseconds since the start, as of the last get()
+        atexit.register(self.close)  # The game loops leave through sys.exit()
+
+    def get(self):
+        events = pygame.event.get()
+        ms = self.ms = pygame.time.get_ticks() - self.start
+        for event in events:
+            if event.type == KEYDOWN:
+                self.file.write(InputRecorder.RECORD.pack(self.frame, ms, InputRecorder.KIND_KEYDOWN, event.key))
+            elif event.type == KEYUP:
+                self.file.write(InputRecorder.RECORD.pack(self.frame, ms, InputRecorder.KIND_KEYUP, event.key))
+            elif USEREVENT <= event.type < NUMEVENTS:
+                self.file.write(InputRecorder.RECORD.pack(self.frame, ms, InputRecorder.KIND_TIMER, event.type))
+        return events
+
+    def close(self):
+        if not self.file.closed:
+            # pygame may already be shut down here, so the time of the last get() is used
+            self.file.write(InputRecorder.RECORD.pack(self.frame, self.ms, InputRecorder.KIND_END, 0))
+            self.file.close()
+
+
+class InputReplay(LiveInput):
+    '''
+    Feeds the events of a file written by InputRecorder back into the game loops,
+    each in the frame it was recorded in. Timers are not started (their events are replayed instead).\n
+    In real speed mode frames are limited to the recorded fps, in unlimited mode
+    the replay runs as fast as possible (and wait() doesn't pause).\n
+
+    When the frame the recorded session ended in is reached, a QUIT event is returned (see stats() for the throughput).
+    '''
+
+    def __init__(self, filename, unlimited=False):
+        with open(filename, 'rb') as f:
+            data = f.read()
+
+        magic, version, seed, fps = InputRecorder.HEADER.unpack_from(data)
+        if magic != InputRecorder.MAGIC or version != InputRecorder.VERSION:
+            raise ValueError(f"'{filename}' is not a recording of a supported version.")
+
+        LiveInput.__init__(self, fps)
+        self.seed = seed
+        self.unlimited = unlimited
+        random.seed(self.seed)
+        AnimatedSpriteSheet.clock.source = self.now
+
+        self.records = list(InputRecorder.RECORD.iter_unpack(data[InputRecorder.HEADER.size:]))
+        self.position = 0
+        # The session ends in the frame of the end marker (or after the frame of the last event, if the recording was cut short)
+        self.end_frame = self.records[-1][0] if self.records else 0
+        self.ended = bool(self.records) and self.records[-1][2] == InputRecorder.KIND_END
+        self.start = time.perf_counter()
+
+    def get(self):
+        # Keep the window responsive, but only let the player close it
+        events = [event for event in pygame.event.get() if event.type == QUIT]
+
+        while self.position < len(self.records) and self.records[self.position][0] <= self.frame:
+            frame, ms, kind, code = self.records[self.position]
+            if kind == InputRecorder.KIND_KEYDOWN:
+                events.append(pygame.event.Event(KEYDOWN, key=code))
+            elif kind == InputRecorder.KIND_KEYUP:
+                events.append(pygame.event.Event(KEYUP, key=code))
+            elif kind == InputRecorder.KIND_TIMER:
+                events.append(pygame.event.Event(code))
+            self.position += 1
+
+        if self.finished():
+            events.append(pygame.event.Event(QUIT))
+        return events
+
+    def finished(self):
+        # The end marker is written in the frame the session quit in, before that frame's tick()
+        if self.ended:
+            return self.frame >= self.end_frame
+        return self.frame > self.end_frame
+
+    def stats(self):
+        '''
+        Returns a dict with the number of frames replayed so far, the seconds it took and the frames per second.
+        '''
+        elapsed = time.perf_counter() - self.start
+        return {
+            'frames': self.frame,
+            'seconds': elapsed,
+            'frames_per_second': self.frame / max(elapsed, 1e-9)
+        }
+
+    def tick(self, clock, fps):
+        self.frame += 1
+        if not self.unlimited:
+            clock.tick(fps)
+
+    def set_timer(self, event_type, ms):
+        pass  # The fired timer events are part of the recording
+
+    def wait(self, seconds):
+        if not self.unlimited:
+            time.sleep(seconds)
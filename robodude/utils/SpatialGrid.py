@@ -0,0 +1,95 @@
+class SpatialGrid:
+    '''
+    Uniform grid of buckets used to look up items by area.\n
+    Every item is stored in each cell its rect overlaps, so a query only has to look
+    at the few cells the queried rect overlaps, no matter how many items there are.\n
+
+    Items can be anything hashable (the Dungeon stores indices into its 'collision_index').
+    '''
+
+    def __init__(self, cell_w, cell_h, origin=(0, 0)):
+        '''
+        Parameters:\n
+        cell_w, cell_h - size of a single cell (in pixels)\n
+        origin - the (x, y) position where the first cell starts
+        '''
+        self.cell_w = cell_w
+        self.cell_h = cell_h
+        self.origin = origin
+        self.cells = dict()  # (col, row) -> list of items
+
+    def cell_range(self, rect):
+        '''
+        Returns the (first col, last col, first row, last row) covered by the rect (inclusive).
+        '''
+        x, y, w, h = rect[0] - self.origin[0], rect[1] - self.origin[1], rect[2], rect[3]
+        return (x // self.cell_w, (x + w - 1) // self.cell_w,
+                y // self.cell_h, (y + h - 1) // self.cell_h)
+
+    def insert(self, item, rect):
+        c0, c1, r0, r1 = self.cell_range(rect)
+        for row in range(r0, r1 + 1):
+            for col in range(c0, c1 + 1):
+                self.cells.setdefault((col, row), []).append(item)
+
+    def insert_many(self, items, rects):
+        '''
+        Inserts every item with the rect at the same position (faster than calling insert() for each).
+        '''
+        cells = self.cells
+        cell_w, cell_h = self.cell_w, self.cell_h
+        origin_x, origin_y = self.origin
+        for item, (x, y, w, h) in zip(items, rects):
+            x -= origin_x
+            y -= origin_y
+            c0, c1, r0, r1 = x // cell_w, (x + w - 1) // cell_w, y // cell_h, (y + h - 1) // cell_h
+            if c0 == c1 and r0 == r1:
+                cells.setdefault((c0, r0), []).append(item)
+            else:
+                for row in range(r0, r1 + 1):
+                    for col in range(c0, c1 + 1):
+                        cells.setdefault((col, row), []).append(item)
+
+    def remove(self, item, rect):
+        c0, c1, r0, r1 = self.cell_range(rect)
+        for row in range(r0, r1 + 1):
+            for col in range(c0, c1 + 1):
+                bucket = self.cells[(col, row)]
+                bucket.remove(item)
+                if not bucket:
+                    del self.cells[(col, row)]
+
+    def replace(self, item, new_item, rect):
+        '''
+        Renames an item that is stored under the given rect (used when an item's index changes).
+        '''
+        c0, c1, r0, r1 = self.cell_range(rect)
+        for row in range(r0, r1 + 1):
+            for col in range(c0, c1 + 1):
+                bucket = self.cells[(col, row)]
+                bucket[bucket.index(item)] = new_item
+
+    def clear(self):
+        self.cells = dict()
+
+    def query(self, rect):
+        '''
+        Returns a set of every item stored in the cells the rect overlaps.\n
+        The items are only candidates - their own rects still have to be tested for collision.\n
+        Big rects (e.g. the whole view) that cover more cells than there are occupied ones
+        are answered by going through the occupied cells instead.
+        '''
+        found = set()
+        c0, c1, r0, r1 = self.cell_range(rect)
+        if (c1 - c0 + 1) * (r1 - r0 + 1) > len(self.cells):
+            for (col, row), bucket in self.cells.items():
+                if c0 <= col <= c1 and r0 <= row <= r1:
+                    found.update(bucket)
+            return found
+
+        for row in range(r0, r1 + 1):
+            for col in range(c0, c1 + 1):
+                bucket = self.cells.get((col, row))
+                if bucket:
+                    found.update(bucket)
+        return found
@@ -0,0 +1,36 @@
+from collections import OrderedDict
+
+
+class TextCache:
+    '''
+    Memoizes rendered text Surfaces of a single font.\n
+    Font rasterization is expensive, so every (text, color, background) combination
+    is rendered only once and reused until it is pushed out by newer strings
+    (at most 'max_entries' Surfaces are kept).
+    '''
+
+    def __init__(self, font, antialias=True, max_entries=64):
+        self.font = font
+        self.antialias = antialias
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (text, color, background) -> Surface
+
+    def render(self, text, color, background=None):
+        key = (text, color, background)
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.entries.move_to_end(key)
+            return surface
+
+        if background is None:
+            surface = self.font.render(text, self.antialias, color)
+        else:
+            surface = self.font.render(text, self.antialias, color, background)
+
+        self.entries[key] = surface
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.entries.clear()